@@ -1,3 +1,14 @@
+# ./main.sh --preview: render pages on request, without building public/
+if [ "$1" = "--preview" ]; then
+    exec python server.py --preview
+fi
+
 python src/main.py
-python server.py --dir public
 
+# ./main.sh --watch: rebuild on every change while the server is running
+if [ "$1" = "--watch" ]; then
+    python src/main.py --watch &
+    trap 'kill $!' EXIT
+fi
+
+python server.py --dir public
@@ -1,32 +1,466 @@
 import os
 import argparse
+import email.utils
+import hashlib
+import io
+import queue
+import re
+import selectors
+import socket
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timezone
+from functools import partial
+from http import HTTPStatus
 from http.server import HTTPServer, SimpleHTTPRequestHandler
+from urllib.parse import urlsplit
+
+
+COMPRESSIBLE = {".html", ".css", ".js", ".svg", ".json", ".txt", ".xml"}
+# html must be revalidated so edits show up, everything else can be reused
+# for a while; conditional requests make revalidating cost a 304
+CACHE_CONTROL = {
+    ".html": "no-cache",
+    ".css": "public, max-age=3600",
+    ".js": "public, max-age=3600",
+    ".png": "public, max-age=86400",
+    ".jpg": "public, max-age=86400",
+    ".jpeg": "public, max-age=86400",
+    ".gif": "public, max-age=86400",
+    ".webp": "public, max-age=86400",
+    ".svg": "public, max-age=86400",
+    ".woff2": "public, max-age=86400",
+}
+DEFAULT_CACHE_CONTROL = "public, max-age=300"
+# names written by `main.py --fingerprint` change whenever their content does
+FINGERPRINTED = re.compile(r"\.[0-9a-f]{10}\.\w+$")
+IMMUTABLE = "public, max-age=31536000, immutable"
+# found before run() changes the working directory
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "src")
+
+
+# like ThreadingHTTPServer, but with a bounded number of worker threads that
+# are only busy while a request is being handled: keep-alive connections wait
+# for their next request in a single selector thread, see park()
+class PooledHTTPServer(HTTPServer):
+    request_queue_size = 128
+    # idle keep-alive connections cost a file descriptor, not a worker
+    keep_alive_timeout = 30
+
+    def __init__(self, server_address, handler_class, workers=16, max_pending=None):
+        self.pool = ThreadPoolExecutor(workers, thread_name_prefix="http")
+        # connections handed to the pool at once; past this nothing new is
+        # accepted, and clients queue in the listen backlog instead
+        self.slots = threading.BoundedSemaphore(max_pending or workers * 4)
+        self.parked = queue.SimpleQueue()
+        self.idle = selectors.DefaultSelector()
+        self.wakeup, self.waker = socket.socketpair()
+        self.idle.register(self.wakeup, selectors.EVENT_READ)
+        self.closing = False
+        super().__init__(server_address, handler_class)
+        self.idle_thread = threading.Thread(
+            target=self.watch_idle, name="http-idle", daemon=True
+        )
+        self.idle_thread.start()
+
+    def submit(self, fn, *args):
+        self.slots.acquire()
+        future = self.pool.submit(fn, *args)
+        future.add_done_callback(lambda f: self.slots.release())
+
+    def process_request(self, request, client_address):
+        self.submit(self.process_request_thread, request, client_address)
+
+    def process_request_thread(self, request, client_address):
+        try:
+            handler = self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+            self.shutdown_request(request)
+            return
+
+        self.park_or_close(handler)
+
+    def finish_request(self, request, client_address):
+        return self.RequestHandlerClass(request, client_address, self)
+
+    def resume(self, handler):
+        # the next request on a parked connection, like the handler's
+        # constructor handles the first one
+        try:
+            try:
+                handler.handle()
+            finally:
+                handler.finish()
+        except Exception:
+            self.handle_error(handler.request, handler.client_address)
+            handler.close_connection = True
+        self.park_or_close(handler)
+
+    def park_or_close(self, handler):
+        # only once the worker is done with the handler: as soon as it's
+        # parked, the next request may resume it on another worker
+        if handler.close_connection:
+            self.shutdown_request(handler.request)
+        else:
+            self.park(handler)
+
+    def park(self, handler):
+        self.parked.put(handler)
+        self.waker.send(b"\0")
+
+    def watch_idle(self):
+        deadlines = OrderedDict()
+        while not self.closing:
+            for key, _ in self.idle.select(timeout=1):
+                if key.fileobj is self.wakeup:
+                    self.wakeup.recv(4096)
+                    while not self.parked.empty():
+                        handler = self.parked.get()
+                        self.idle.register(
+                            handler.connection, selectors.EVENT_READ, handler
+                        )
+                        deadlines[handler] = time.monotonic() + self.keep_alive_timeout
+                else:
+                    # the next request, or the client closing the connection
+                    self.idle.unregister(key.fileobj)
+                    del deadlines[key.data]
+                    self.submit(self.resume, key.data)
+
+            # parked in order, all with the same timeout
+            now = time.monotonic()
+            while deadlines and next(iter(deadlines.values())) <= now:
+                handler, _ = deadlines.popitem(last=False)
+                self.idle.unregister(handler.connection)
+                self.close_parked(handler)
+
+        for handler in deadlines:
+            self.close_parked(handler)
+        self.idle.close()
+
+    def close_parked(self, handler):
+        handler.close_connection = True
+        handler.finish()
+        self.shutdown_request(handler.request)
+
+    def server_close(self):
+        super().server_close()
+        self.closing = True
+        self.waker.send(b"\0")
+        self.idle_thread.join()
+        self.wakeup.close()
+        self.waker.close()
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+
+class FileCache:
+    # strong etags for every file served, plus the bytes of small files, so
+    # hot files are served without touching the disk beyond a stat(); etags
+    # have their own table, so keeping bodies never pushes out the etag of a
+    # big file, the most expensive one to hash again
+    def __init__(self, max_bytes=32 << 20, max_file_size=256 << 10, max_entries=10_000):
+        self.max_bytes = max_bytes
+        self.max_file_size = max_file_size
+        self.max_entries = max_entries
+        self.etags = OrderedDict()
+        self.bodies = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def get(self, path):
+        # returns (stat, etag, file) for the bytes to send: kept ones, or the
+        # file the stat was taken from, so the headers still describe what's
+        # sent when the path is replaced in the meantime; the caller closes it
+        st = os.stat(path)
+        key = (st.st_mtime_ns, st.st_size, st.st_ino)
+        with self.lock:
+            etag = self._lookup(self.etags, path, key)
+            body = self._lookup(self.bodies, path, key)
+        if etag is not None and body is not None:
+            return st, etag, io.BytesIO(body)
+
+        f = open(path, "rb")
+        try:
+            st = os.fstat(f.fileno())
+            key = (st.st_mtime_ns, st.st_size, st.st_ino)
+            with self.lock:
+                etag = self._lookup(self.etags, path, key)
+            body = None
+            if etag is None:
+                etag, body = self._read(f, st)
+                with self.lock:
+                    self._store_etag(path, key, etag)
+                    if body is not None:
+                        self._store_body(path, key, body)
+        except BaseException:
+            f.close()
+            raise
+
+        if body is None:
+            f.seek(0)
+            return st, etag, f
+        f.close()
+        return st, etag, io.BytesIO(body)
+
+    def _read(self, f, st):
+        # the etag, and the bytes of a file small enough to keep
+        h = hashlib.blake2b(digest_size=16)
+        if st.st_size <= self.max_file_size:
+            body = f.read()
+            h.update(body)
+            return f'"{h.hexdigest()}"', body
+
+        while chunk := f.read(1 << 20):
+            h.update(chunk)
+        return f'"{h.hexdigest()}"', None
+
+    def _lookup(self, table, path, key):
+        entry = table.get(path)
+        if entry is None or entry[0] != key:
+            return None
+        table.move_to_end(path)
+        return entry[1]
+
+    def _store_etag(self, path, key, etag):
+        self.etags[path] = (key, etag)
+        self.etags.move_to_end(path)
+        while len(self.etags) > self.max_entries:
+            self.etags.popitem(last=False)
+
+    def _store_body(self, path, key, body):
+        old = self.bodies.pop(path, None)
+        if old is not None:
+            self.size -= len(old[1])
+        if len(body) > self.max_bytes:
+            return
+
+        self.bodies[path] = (key, body)
+        self.size += len(body)
+        while self.size > self.max_bytes:
+            _, evicted = self.bodies.popitem(last=False)
+            self.size -= len(evicted[1])
 
 
 class CORSHTTPRequestHandler(SimpleHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # how long a request may take to arrive; idle keep-alive connections wait
+    # in PooledHTTPServer instead, without holding a worker
+    timeout = 10
+    # headers and body go out in separate writes; without this a small
+    # body waits for the client to ack the headers on a kept-alive connection
+    disable_nagle_algorithm = True
+    vary = False
+
+    def handle(self):
+        if not hasattr(self.server, "park"):
+            return super().handle()
+
+        # one request, and any the client pipelined behind it: those are
+        # already read into rfile, where the server's selector can't see them
+        try:
+            self.handle_one_request()
+            while not self.close_connection and self.request_buffered():
+                self.handle_one_request()
+        except BaseException:
+            self.close_connection = True
+            raise
+
+    def finish(self):
+        # a kept-alive connection stays open, the server parks it
+        if self.close_connection or not hasattr(self.server, "park"):
+            super().finish()
+
+    def request_buffered(self):
+        self.connection.settimeout(0)
+        try:
+            return bool(self.rfile.peek(1))
+        except OSError:
+            return False
+        finally:
+            self.connection.settimeout(self.timeout)
+
     def end_headers(self):
         self.send_header("Access-Control-Allow-Origin", "*")
         self.send_header("Access-Control-Allow-Methods", "GET, OPTIONS")
         self.send_header("Access-Control-Allow-Headers", "*")
+        if self.vary:
+            self.send_header("Vary", "Accept-Encoding")
+            self.vary = False
         super().end_headers()
 
+    def send_head(self):
+        path = self.translate_path(self.path)
+        if os.path.isdir(path) and self.path.partition("?")[0].endswith("/"):
+            path = os.path.join(path, "index.html")
+        if not os.path.isfile(path) or path.endswith("/"):
+            # redirects, directory listings and 404s
+            return super().send_head()
+
+        self.vary = os.path.splitext(path)[1] in COMPRESSIBLE
+        gz = path + ".gz"
+        if self.vary and self.accepts_gzip() and os.path.isfile(gz):
+            # serve the copy compressed at build time instead of compressing here
+            return self.send_file(gz, self.guess_type(path), "gzip")
+
+        return self.send_file(path, self.guess_type(path))
+
+    def send_file(self, path, ctype, encoding=None):
+        try:
+            st, etag, f = self.server.files.get(path)
+        except OSError:
+            self.send_error(HTTPStatus.NOT_FOUND, "File not found")
+            return None
+
+        name = os.path.basename(path.removesuffix(".gz") if encoding else path)
+        if FINGERPRINTED.search(name):
+            cache_control = IMMUTABLE
+        else:
+            ext = os.path.splitext(name)[1]
+            cache_control = self.server.cache_control.get(ext, DEFAULT_CACHE_CONTROL)
+        if self.not_modified(etag, st.st_mtime):
+            f.close()
+            self.send_response(HTTPStatus.NOT_MODIFIED)
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", cache_control)
+            self.end_headers()
+            return None
+
+        self.send_response(200)
+        self.send_header("Content-Type", ctype)
+        if encoding:
+            self.send_header("Content-Encoding", encoding)
+        self.send_header("Content-Length", str(st.st_size))
+        self.send_header("Last-Modified", self.date_time_string(st.st_mtime))
+        self.send_header("ETag", etag)
+        self.send_header("Cache-Control", cache_control)
+        self.end_headers()
+        return f
+
+    def not_modified(self, etag, mtime=None):
+        # If-None-Match wins over If-Modified-Since when both are sent
+        if_none_match = self.headers.get("If-None-Match")
+        if if_none_match is not None:
+            tags = [t.strip().removeprefix("W/") for t in if_none_match.split(",")]
+            return "*" in tags or etag in tags
+
+        if_modified_since = self.headers.get("If-Modified-Since")
+        if if_modified_since is None or mtime is None:
+            return False
+        try:
+            since = email.utils.parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError, IndexError, OverflowError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+
+        # Last-Modified only has whole seconds
+        return int(mtime) <= since.timestamp()
+
+    def accepts_gzip(self):
+        # an explicit gzip wins over *, wherever they are in the list
+        qs = {}
+        for coding in self.headers.get("Accept-Encoding", "").split(","):
+            name, _, params = coding.lower().partition(";")
+            q = params.strip().removeprefix("q=")
+            try:
+                qs[name.strip()] = float(q) if q else 1.0
+            except ValueError:
+                qs[name.strip()] = 0.0
+
+        return qs.get("gzip", qs.get("*", 0.0)) > 0
+
     def do_OPTIONS(self):
         self.send_response(200, "OK")
+        self.send_header("Content-Length", "0")
         self.end_headers()
 
+    def copyfile(self, source, outputfile):
+        # let the kernel move the file to the socket; socket.sendfile falls
+        # back to plain sends for objects without a real file descriptor
+        self.connection.sendfile(source)
+
+
+class PreviewHTTPRequestHandler(CORSHTTPRequestHandler):
+    # pages are rendered from the markdown on request by server.site, every
+    # other path is served from the static dir
+
+    def send_head(self):
+        url_path = urlsplit(self.path).path
+        site = self.server.site
+        src = site.find_page(url_path)
+        if src is None:
+            if not url_path.endswith("/") and site.is_section(url_path):
+                self.send_response(HTTPStatus.MOVED_PERMANENTLY)
+                self.send_header("Location", url_path + "/")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return None
+            return super().send_head()
+
+        try:
+            body = site.render(src)
+        except Exception as e:
+            self.send_error(HTTPStatus.INTERNAL_SERVER_ERROR, f"{str(src)!r}: {e!r}")
+            return None
+
+        etag = f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+        if self.not_modified(etag):
+            self.send_response(HTTPStatus.NOT_MODIFIED)
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", "no-cache")
+            self.end_headers()
+            return None
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        return io.BytesIO(body)
+
 
 def run(
     server_class=HTTPServer,
     handler_class=CORSHTTPRequestHandler,
     port=8000,
     directory=None,
+    workers=16,
+    preview=False,
+    cache_control=None,
+    hot_cache_size=32 << 20,
 ):
     if directory:
         os.chdir(directory)
 
+    site = None
+    if preview:
+        # the generator isn't a package, so import it the way src/main.py runs
+        sys.path.insert(0, SRC_DIR)
+        from main import CONTENT_DIR, STATIC_DIR, TEMPLATE_PATH
+        from preview import PreviewSite
+
+        site = PreviewSite(CONTENT_DIR, TEMPLATE_PATH)
+        handler_class = partial(PreviewHTTPRequestHandler, directory=STATIC_DIR)
+
     server_address = ("", port)
-    httpd = server_class(server_address, handler_class)
-    print(f"Serving HTTP on http://localhost:{port} from directory '{directory}'...")
+    if workers > 0:
+        httpd = PooledHTTPServer(server_address, handler_class, workers)
+    else:
+        httpd = server_class(server_address, handler_class)
+    httpd.site = site
+    httpd.files = FileCache(hot_cache_size)
+    httpd.cache_control = {**CACHE_CONTROL, **(cache_control or {})}
+
+    if preview:
+        print(f"Previewing '{directory}' on http://localhost:{port}...")
+    else:
+        print(
+            f"Serving HTTP on http://localhost:{port} from directory '{directory}'..."
+        )
     httpd.serve_forever()
 
 
@@ -36,7 +470,40 @@ if __name__ == "__main__":
         "--dir", type=str, help="Directory to serve files from", default="."
     )
     parser.add_argument("--port", type=int, help="Port to serve HTTP on", default=8888)
+    parser.add_argument(
+        "--workers",
+        type=int,
+        help="Number of requests handled at once (0 = one connection at a time)",
+        default=16,
+    )
+    parser.add_argument(
+        "--preview",
+        action="store_true",
+        help="Render pages from content/ on request instead of serving --dir as is "
+        "(--dir is then the project root)",
+    )
+    parser.add_argument(
+        "--cache-control",
+        action="append",
+        default=[],
+        metavar="EXT=VALUE",
+        help="Cache-Control sent for files ending in EXT, e.g. .css=no-cache "
+        "(can be repeated)",
+    )
+    parser.add_argument(
+        "--hot-cache",
+        type=int,
+        default=32,
+        metavar="MB",
+        help="Memory used to keep small, often requested files (0 = disabled)",
+    )
     args = parser.parse_args()
 
-    run(port=args.port, directory=args.dir)
-
+    run(
+        port=args.port,
+        directory=args.dir,
+        workers=args.workers,
+        preview=args.preview,
+        cache_control=dict(arg.split("=", 1) for arg in args.cache_control),
+        hot_cache_size=args.hot_cache << 20,
+    )
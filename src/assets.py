@@ -0,0 +1,227 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import sys
+
+from pathlib import Path
+from urllib.parse import quote, unquote
+
+from manifest import file_hash
+
+
+if sys.platform == "linux":
+    import fcntl
+
+    FICLONE = 0x40049409  # _IOW(0x94, 9, int) from linux/fs.h
+else:
+    fcntl = None
+
+
+# assets that pages point to and browsers cache; files that must keep their
+# name (favicon.ico, robots.txt, ...) are left alone
+FINGERPRINTED = {
+    ".css",
+    ".js",
+    ".png",
+    ".jpg",
+    ".jpeg",
+    ".gif",
+    ".webp",
+    ".svg",
+    ".woff",
+    ".woff2",
+}
+ASSET_MAP_NAME = "assets.json"
+URL_ATTR = re.compile(r'\b(href|src)="(/[^"]*)"')
+
+
+class AssetMap:
+    # what the build knows about static assets, used to rewrite references in
+    # templates and pages: original url -> fingerprinted url, and the
+    # (width, height) of images
+    def __init__(self, urls=None, sizes=None):
+        self.urls = urls or {}
+        self.sizes = sizes or {}
+        # only what templates are rewritten with; pages and cached blocks
+        # depend on the few assets they reference, see signature()
+        data = json.dumps(self.urls, sort_keys=True).encode()
+        self.fingerprint = hashlib.sha256(data).hexdigest()
+
+    def signature(self, links, images):
+        # what this map contributes to html with these links and images, so
+        # a block or page rendered earlier can be reused while it's the same
+        if not (links or images):
+            return ""
+
+        sig = [self.url(href) for href in links]
+        for image in images:
+            sig.append(self.url(image["src"]))
+            sig.append(self.sizes.get(local_path(image["src"])[0]))
+        data = json.dumps(sig).encode()
+        return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+    def url(self, url):
+        path, rest = local_path(url)
+        hashed = self.urls.get(path)
+        return quote(hashed) + rest if hashed else url
+
+    def references(self, html):
+        return [m[2] for m in URL_ATTR.finditer(html)]
+
+    def rewrite_html(self, html):
+        return URL_ATTR.sub(lambda m: f'{m[1]}="{self.url(m[2])}"', html)
+
+    def rewrite_node(self, node):
+        if node.tag == "img" and "src" in node.props:
+            src = node.props["src"]
+            props = {**node.props, "src": self.url(src)}
+            size = self.sizes.get(local_path(src)[0])
+            if size:
+                # reserve the image's space before it loads, so the page
+                # doesn't jump around
+                props["width"], props["height"] = size
+            props["loading"] = "lazy"
+            props["decoding"] = "async"
+            node.props = props
+        elif node.tag == "a" and "href" in node.props:
+            node.props = {**node.props, "href": self.url(node.props["href"])}
+
+        for child in node.children:
+            self.rewrite_node(child)
+
+
+def local_path(url):
+    # the static file a site-root url points to, and its query and fragment
+    if not url.startswith("/") or url.startswith("//"):
+        return None, ""
+
+    end = len(url)
+    for sep in "?#":
+        if sep in url:
+            end = min(end, url.index(sep))
+    return unquote(url[:end]), url[end:]
+
+
+def sync_dir(src, dest, manifest=None, checksum=False, link=False, fingerprint=False):
+    src = Path(src)
+    dest = Path(dest)
+    dest.mkdir(parents=True, exist_ok=True)
+
+    urls = {}
+    copied = unchanged = 0
+    for src_p in iter_files(src):
+        rel = src_p.relative_to(src)
+        outputs = [dest.joinpath(rel)]
+        if fingerprint and src_p.suffix in FINGERPRINTED:
+            # the original name is kept too, for references the build can't
+            # see: url() in stylesheets, links from other sites
+            h = manifest.hash(src_p) if manifest else file_hash(src_p)
+            hashed = rel.with_name(f"{rel.stem}.{h[:10]}{rel.suffix}")
+            urls[f"/{rel.as_posix()}"] = f"/{hashed.as_posix()}"
+            outputs.append(dest.joinpath(hashed))
+
+        for dest_p in outputs:
+            if manifest:
+                manifest.assets.add(str(dest_p))
+
+            if is_synced(src_p, dest_p, checksum):
+                unchanged += 1
+                continue
+
+            dest_p.parent.mkdir(parents=True, exist_ok=True)
+            method = copy_file(src_p, dest_p, link)
+            copied += 1
+            print(f"[INFO] {method} {str(src_p)!r} to {str(dest_p)!r}")
+
+    if fingerprint:
+        write_asset_map(dest / ASSET_MAP_NAME, urls)
+        if manifest:
+            manifest.assets.add(str(dest / ASSET_MAP_NAME))
+
+    deleted = 0
+    if manifest:
+        for p in map(Path, manifest.stale_assets()):
+            if p.is_file():
+                p.unlink()
+                deleted += 1
+                print(f"[INFO] Deleted stale asset {str(p)!r}")
+
+    print(
+        f"[INFO] Synced {str(src)!r} to {str(dest)!r}: "
+        f"{copied} copied, {unchanged} unchanged, {deleted} deleted"
+    )
+    return urls
+
+
+def write_asset_map(path, urls):
+    data = json.dumps(urls, indent=1, sort_keys=True) + "\n"
+    # unchanged maps keep their mtime, so they aren't copied or compressed again
+    if path.is_file() and path.read_text() == data:
+        return
+
+    tmp = path.with_name(f".{path.name}.tmp")
+    tmp.write_text(data)
+    tmp.replace(path)
+
+
+def iter_files(root):
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for name in sorted(filenames):
+            yield Path(dirpath, name)
+
+
+def is_synced(src, dest, checksum=False):
+    try:
+        dest_st = dest.stat()
+    except FileNotFoundError:
+        return False
+
+    src_st = src.stat()
+    if src_st.st_size != dest_st.st_size:
+        return False
+    if src_st.st_mtime_ns == dest_st.st_mtime_ns:
+        return True
+    if not checksum or file_hash(src) != file_hash(dest):
+        return False
+
+    # same bytes, only the mtime drifted: fix it so the next check is cheap
+    os.utime(dest, ns=(src_st.st_atime_ns, src_st.st_mtime_ns))
+    return True
+
+
+def copy_file(src, dest, link=False):
+    # copy next to the destination and rename over it, so readers never see
+    # a partially written file
+    tmp = dest.with_name(f".{dest.name}.tmp")
+    tmp.unlink(missing_ok=True)
+
+    method = None
+    if link:
+        try:
+            os.link(src, tmp)
+            method = "Linked"
+        except OSError:
+            pass
+
+    if method is None and fcntl:
+        try:
+            with open(src, "rb") as fsrc, open(tmp, "wb") as fdest:
+                fcntl.ioctl(fdest.fileno(), FICLONE, fsrc.fileno())
+            method = "Cloned"
+        except OSError:
+            tmp.unlink(missing_ok=True)
+
+    if method is None:
+        # copyfile already uses sendfile/copy_file_range where it can
+        shutil.copyfile(src, tmp)
+        method = "Copied"
+
+    if method != "Linked":
+        st = src.stat()
+        os.utime(tmp, ns=(st.st_atime_ns, st.st_mtime_ns))
+
+    tmp.replace(dest)
+    return method
@@ -0,0 +1,248 @@
+import argparse
+import json
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from pathlib import Path
+
+from text_node import block_to_html_node, scan_blocks
+from html_node import ParentNode
+
+
+# scan_blocks splits and classifies blocks in the same pass, so "blocks" covers
+# what used to be timed as separate split and type stages
+STAGES = ["read", "blocks", "inline", "serialize", "write"]
+
+WORDS = (
+    "the quick brown fox jumps over lazy dog middle earth ring hobbit elf "
+    "dwarf wizard shire mordor river mountain forest tower king road"
+).split()
+
+
+def words(rng, n):
+    return " ".join(rng.choice(WORDS) for _ in range(n))
+
+
+def prose_block(rng):
+    parts = [words(rng, rng.randint(5, 15)) for _ in range(4)]
+    return f"{parts[0]} **{parts[1]}** {parts[2]} *{parts[3]}* `code`."
+
+
+def links_block(rng):
+    links = (
+        f"[{words(rng, 2)}](/{'/'.join(words(rng, 3).split())})"
+        for _ in range(rng.randint(50, 200))
+    )
+    return " and ".join(links)
+
+
+def list_block(rng):
+    marker = rng.choice(["- ", "* ", "1. "])
+    items = (
+        f"{marker}{words(rng, rng.randint(3, 12))}" for _ in range(rng.randint(50, 300))
+    )
+    return "\n".join(items)
+
+
+def code_block(rng):
+    lines = (
+        f"    {words(rng, rng.randint(2, 10))}()" for _ in range(rng.randint(200, 2000))
+    )
+    return "```\n" + "\n".join(lines) + "\n```"
+
+
+MIXES = {
+    "prose": prose_block,
+    "links": links_block,
+    "lists": list_block,
+    "code": code_block,
+}
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name not in MIXES:
+            raise ValueError(f"Unknown mix {name!r}, expected one of {list(MIXES)}")
+        mix[name] = float(weight or 1)
+
+    return mix
+
+
+def make_corpus(root, pages, mix, blocks=20, depth=1, seed=0):
+    rng = random.Random(seed)
+    names, weights = list(mix), list(mix.values())
+
+    root = Path(root)
+    for i in range(pages):
+        # spread pages over a tree `depth` levels deep, 10 dirs per level
+        parts = [f"d{(i // 10**level) % 10}" for level in range(depth - 1, 0, -1)]
+        path = root.joinpath(*parts, f"page{i}.md")
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        body = [f"# page {i}"]
+        body += [MIXES[n](rng) for n in rng.choices(names, weights, k=blocks)]
+        path.write_text("\n\n".join(body))
+
+
+def run_benchmark(src_dir, dest_dir):
+    timings = dict.fromkeys(STAGES, 0.0)
+    pages = bytes_in = 0
+
+    for src_path in sorted(Path(src_dir).rglob("*.md")):
+        dest_path = Path(dest_dir, src_path.relative_to(src_dir)).with_suffix(".html")
+        dest_path.parent.mkdir(parents=True, exist_ok=True)
+
+        t0 = time.perf_counter()
+        markdown = src_path.read_text()
+        t1 = time.perf_counter()
+        blocks = scan_blocks(markdown)
+        t2 = time.perf_counter()
+        node = ParentNode("div", [block_to_html_node(b, t) for t, b in blocks])
+        t3 = time.perf_counter()
+        html = node.to_html()
+        t4 = time.perf_counter()
+        dest_path.write_text(html)
+        t5 = time.perf_counter()
+
+        for stage, start, end in zip(
+            STAGES, (t0, t1, t2, t3, t4), (t1, t2, t3, t4, t5)
+        ):
+            timings[stage] += end - start
+
+        pages += 1
+        bytes_in += len(markdown.encode())
+
+    return timings, pages, bytes_in
+
+
+def peak_memory(src_dir, dest_dir):
+    tracemalloc.start()
+    try:
+        run_benchmark(src_dir, dest_dir)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def benchmark(src_dir, dest_dir, repeat=3):
+    # keep the fastest run of each stage, the others mostly measure noise
+    best = dict.fromkeys(STAGES, float("inf"))
+    for _ in range(repeat):
+        timings, pages, bytes_in = run_benchmark(src_dir, dest_dir)
+        best = {s: min(best[s], timings[s]) for s in STAGES}
+
+    total = sum(best.values())
+    return {
+        "pages": pages,
+        "bytes": bytes_in,
+        "stages": best,
+        "total": total,
+        "pages_per_sec": pages / total if total else 0.0,
+        "mb_per_sec": bytes_in / 1e6 / total if total else 0.0,
+        "peak_memory": peak_memory(src_dir, dest_dir),
+    }
+
+
+def compare(results, baseline, threshold):
+    rows = [(s, baseline["stages"].get(s), results["stages"][s]) for s in STAGES]
+    rows.append(("total", baseline["total"], results["total"]))
+
+    regressions = []
+    for stage, old, new in rows:
+        if not old:
+            continue
+
+        ratio = new / old
+        flag = ""
+        if ratio > 1 + threshold:
+            regressions.append(stage)
+            flag = "  <-- regression"
+        print(f"{stage:>10}: {old:9.4f}s -> {new:9.4f}s ({ratio:5.2f}x){flag}")
+
+    return regressions
+
+
+def print_results(results):
+    for stage, seconds in results["stages"].items():
+        share = seconds / results["total"] * 100 if results["total"] else 0
+        print(f"{stage:>10}: {seconds:9.4f}s {share:5.1f}%")
+
+    print(
+        f"{results['pages']} pages, {results['bytes'] / 1e6:.1f} MB: "
+        f"{results['pages_per_sec']:.1f} pages/s, {results['mb_per_sec']:.2f} MB/s, "
+        f"peak {results['peak_memory'] / 1e6:.1f} MB traced"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the markdown -> HTML pipeline"
+    )
+    parser.add_argument("--pages", type=int, default=200, help="Pages to generate")
+    parser.add_argument("--blocks", type=int, default=20, help="Blocks per page")
+    parser.add_argument("--depth", type=int, default=3, help="Directory depth")
+    parser.add_argument(
+        "--mix",
+        type=parse_mix,
+        default="prose,links,lists,code",
+        help="Comma separated block kinds with optional weights, e.g. links=3,code=1",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Corpus random seed")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per stage")
+    parser.add_argument("--corpus", type=Path, help="Benchmark this directory instead")
+    parser.add_argument("--output", type=Path, help="Write results as JSON")
+    parser.add_argument("--baseline", type=Path, help="Compare with saved results")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="Slowdown ratio above which a stage counts as a regression",
+    )
+    args = parser.parse_args()
+
+    tmp = Path(tempfile.mkdtemp(prefix="ssg-bench-"))
+    try:
+        src_dir = args.corpus
+        if src_dir is None:
+            src_dir = tmp / "content"
+            make_corpus(
+                src_dir, args.pages, args.mix, args.blocks, args.depth, args.seed
+            )
+
+        results = benchmark(src_dir, tmp / "public", args.repeat)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    results["config"] = {
+        "pages": args.pages,
+        "blocks": args.blocks,
+        "depth": args.depth,
+        "mix": args.mix,
+        "seed": args.seed,
+        "corpus": str(args.corpus) if args.corpus else None,
+        "python": platform.python_version(),
+    }
+    print_results(results)
+
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2))
+        print(f"[INFO] Wrote results to {str(args.output)!r}")
+
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text())
+        if baseline.get("config") != results["config"]:
+            print("[WARNING] Baseline was recorded with a different configuration")
+
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+import hashlib
+import json
+
+from collections import OrderedDict
+from pathlib import Path
+
+
+class BlockCache:
+    VERSION = 3
+
+    # huge blocks (code listings, generated tables) are rarely repeated and
+    # would push everything else out
+    MAX_ENTRY_BYTES = 64 * 1024
+
+    def __init__(self, max_entries=10_000, max_bytes=64 << 20, path=None, namespace=""):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.path = Path(path) if path else None
+        self.namespace = namespace
+
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = self.misses = self.evictions = 0
+        self.added = {}
+
+        if self.path and self.path.exists():
+            data = json.loads(self.path.read_text())
+            if data.get("version") == self.VERSION and data["namespace"] == namespace:
+                for key, (html, info) in data["entries"].items():
+                    self._store(key, (html, info))
+                self.evictions = 0
+
+    def options(self):
+        return {
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "path": self.path,
+            "namespace": self.namespace,
+        }
+
+    def key(self, b_type, block):
+        h = hashlib.blake2b(digest_size=16)
+        h.update(b_type.value.encode())
+        h.update(b"\0")
+        h.update(block.encode())
+        return h.hexdigest()
+
+    def get(self, b_type, block, valid=None):
+        # (html, info) of the block, info being whatever was stored with it;
+        # entries whose info valid() rejects count as misses
+        key = self.key(b_type, block)
+        entry = self.entries.get(key)
+        if entry is None or (valid and not valid(entry[1])):
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return entry
+
+    def put(self, b_type, block, html, info=None):
+        if len(html) > self.MAX_ENTRY_BYTES:
+            return
+
+        key = self.key(b_type, block)
+        self._store(key, (html, info))
+        self.added[key] = (html, info)
+
+    def _store(self, key, entry):
+        old = self.entries.pop(key, None)
+        if old is not None:
+            self.size -= len(old[0])
+
+        self.entries[key] = entry
+        self.size += len(entry[0])
+        while len(self.entries) > self.max_entries or self.size > self.max_bytes:
+            _, evicted = self.entries.popitem(last=False)
+            self.size -= len(evicted[0])
+            self.evictions += 1
+
+    def drain(self):
+        # hand what this process learned back to the parent, see merge()
+        stats = (self.added, self.hits, self.misses)
+        self.added = {}
+        self.hits = self.misses = 0
+        return stats
+
+    def merge(self, stats):
+        added, hits, misses = stats
+        for key, entry in added.items():
+            self._store(key, entry)
+
+        self.hits += hits
+        self.misses += misses
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        rate = self.hits / lookups * 100 if lookups else 0.0
+        return (
+            f"{self.hits} hits, {self.misses} misses ({rate:.1f}% hit rate), "
+            f"{len(self.entries)} entries, {self.size / 1e6:.1f} MB, "
+            f"{self.evictions} evictions"
+        )
+
+    def save(self):
+        if not self.path:
+            return
+
+        data = {
+            "version": self.VERSION,
+            "namespace": self.namespace,
+            "entries": self.entries,
+        }
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(data))
+        tmp.replace(self.path)
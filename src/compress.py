@@ -0,0 +1,81 @@
+import gzip
+import os
+
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from assets import iter_files
+
+
+COMPRESSIBLE = {".html", ".css", ".js", ".svg", ".json", ".txt", ".xml"}
+
+# below this, the gzip header and a second request for the .gz aren't worth it
+MIN_SIZE = 256
+
+
+def compress_dir(root, jobs=1):
+    root = Path(root)
+    files = [p for p in iter_files(root) if p.suffix in COMPRESSIBLE]
+    stale = [p for p in files if needs_compression(p)]
+
+    # zlib releases the GIL, so threads are enough to use every core
+    with ThreadPoolExecutor(max(1, jobs)) as pool:
+        written = sum(pool.map(compress_file, stale))
+
+    # what's left are .gz files whose source is gone
+    deleted = prune_compressed(root)
+    print(
+        f"[INFO] Compressed {written} file(s) in {str(root)!r}, "
+        f"{len(files) - len(stale)} unchanged, {deleted} deleted"
+    )
+
+
+def prune_compressed(root):
+    # the server sends a .gz in place of its source whenever one exists, so
+    # any that is out of date has to go, even in builds without --gzip
+    deleted = 0
+    for gz in Path(root).rglob("*.gz"):
+        src = gz.with_suffix("")
+        if src.suffix not in COMPRESSIBLE:
+            continue
+
+        try:
+            # the .gz carries its source's mtime, see compress_file
+            fresh = gz.stat().st_mtime_ns == src.stat().st_mtime_ns
+        except FileNotFoundError:
+            fresh = False
+        if not fresh:
+            gz.unlink()
+            deleted += 1
+
+    return deleted
+
+
+def gz_path(path):
+    return path.with_name(path.name + ".gz")
+
+
+def needs_compression(path):
+    try:
+        gz_st = gz_path(path).stat()
+    except FileNotFoundError:
+        return path.stat().st_size >= MIN_SIZE
+
+    # the .gz carries its source's mtime, see compress_file
+    return gz_st.st_mtime_ns != path.stat().st_mtime_ns
+
+
+def compress_file(path):
+    gz = gz_path(path)
+    st = path.stat()
+    data = path.read_bytes()
+    compressed = gzip.compress(data, compresslevel=9, mtime=0)
+    if st.st_size < MIN_SIZE or len(compressed) >= len(data):
+        gz.unlink(missing_ok=True)
+        return False
+
+    tmp = gz.with_name(f".{gz.name}.tmp")
+    tmp.write_bytes(compressed)
+    os.utime(tmp, ns=(st.st_atime_ns, st.st_mtime_ns))
+    tmp.replace(gz)
+    return True
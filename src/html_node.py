@@ -1,4 +1,16 @@
+import operator
+
+from types import MappingProxyType
+
+
+# shared by every node without props or children, so leaves allocate nothing
+NO_PROPS = MappingProxyType({})
+NO_CHILDREN = ()
+
+
 class HTMLNode:
+    __slots__ = ("tag", "value", "children", "props", "self_closing")
+
     def __init__(
         self, tag=None, value=None, children=None, props=None, self_closing=False
     ):
@@ -10,25 +22,47 @@ class HTMLNode:
 
         self.tag = tag
         self.value = value
-        self.children = children or []
-        self.props = props or {}
+        self.children = children or NO_CHILDREN
+        self.props = props or NO_PROPS
         self.self_closing = self_closing
 
     def __repr__(self):
-        args = f"{self.tag!r}, {self.value!r}, {self.children!r}, {self.props!r}, {self.self_closing}"
+        args = f"{self.tag!r}, {self.value!r}, {self.children!r}, {dict(self.props)!r}, {self.self_closing}"
         return f"{self.__class__.__name__}({args})"
 
     def __eq__(self, other):
-        return self.__repr__() == other.__repr__()
+        # match on the class name, like the repr comparison this replaces, so
+        # nodes from a second import of this module (src.html_node) still match
+        if self.__class__.__name__ != other.__class__.__name__:
+            return NotImplemented
+
+        return (
+            self.tag == other.tag
+            and self.value == other.value
+            and self.self_closing == other.self_closing
+            and self.props == other.props
+            and len(self.children) == len(other.children)
+            and all(map(operator.eq, self.children, other.children))
+        )
 
     def to_html(self):
+        return "".join(self.iter_html())
+
+    def iter_html(self):
         raise NotImplementedError
 
+    def write_html(self, fp):
+        fp.writelines(self.iter_html())
+
     def props_to_html(self):
+        if not self.props:
+            return ""
         return "".join(f' {key}="{value}"' for key, value in self.props.items())
 
 
 class LeafNode(HTMLNode):
+    __slots__ = ()
+
     def __init__(self, tag, value, props=None, self_closing=False):
         if value is None:
             raise ValueError("Leaf nodes must have a value")
@@ -39,7 +73,9 @@ class LeafNode(HTMLNode):
         super().__init__(tag, value, props=props, self_closing=self_closing)
 
     def __repr__(self):
-        args = f"{self.tag!r}, {self.value!r}, {self.props!r}, {self.self_closing}"
+        args = (
+            f"{self.tag!r}, {self.value!r}, {dict(self.props)!r}, {self.self_closing}"
+        )
         return f"{self.__class__.__name__}({args})"
 
     def to_html(self):
@@ -51,8 +87,13 @@ class LeafNode(HTMLNode):
         else:
             return self.value
 
+    def iter_html(self):
+        yield self.to_html()
+
 
 class ParentNode(HTMLNode):
+    __slots__ = ()
+
     def __init__(self, tag, children, props=None):
         if not tag:
             raise ValueError("Parent nodes must have a tag")
@@ -63,10 +104,12 @@ class ParentNode(HTMLNode):
         super().__init__(tag, None, children, props)
 
     def __repr__(self):
-        args = f"{self.tag!r}, {self.children!r}, {self.props!r}"
+        args = f"{self.tag!r}, {self.children!r}, {dict(self.props)!r}"
         return f"{self.__class__.__name__}({args})"
 
-    def to_html(self):
-        children = "".join(c.to_html() for c in self.children)
-        return f"<{self.tag}{self.props_to_html()}>{children}</{self.tag}>"
+    def iter_html(self):
+        yield f"<{self.tag}{self.props_to_html()}>"
+        for c in self.children:
+            yield from c.iter_html()
+        yield f"</{self.tag}>"
 
@@ -0,0 +1,138 @@
+import json
+import struct
+
+from pathlib import Path
+
+from assets import iter_files
+from manifest import file_hash
+
+
+IMAGE_SUFFIXES = {".png", ".jpg", ".jpeg", ".gif", ".webp"}
+
+# JPEG start-of-frame markers, the ones that carry the image size: C4, C8 and
+# CC in that range are huffman/arithmetic tables and a reserved marker
+SOF_MARKERS = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+# bytes of a WebP file up to the end of its size fields, by chunk type
+WEBP_HEADER_SIZES = {b"VP8 ": 30, b"VP8L": 25, b"VP8X": 30}
+
+
+def scan_images(root, manifest=None, cache_path=None):
+    # width and height of every image under root, by site url; headers are
+    # only parsed for files whose hash isn't in the cache yet
+    root = Path(root)
+    cache_path = Path(cache_path) if cache_path else None
+    known = {}
+    if cache_path and cache_path.exists():
+        known = json.loads(cache_path.read_text())
+
+    sizes = {}
+    seen = {}
+    parsed = False
+    for p in iter_files(root):
+        if p.suffix.lower() not in IMAGE_SUFFIXES:
+            continue
+
+        h = manifest.hash(p) if manifest else file_hash(p)
+        if h not in known:
+            known[h] = image_size(p)
+            parsed = True
+        seen[h] = known[h]
+        if known[h]:
+            sizes[f"/{p.relative_to(root).as_posix()}"] = tuple(known[h])
+
+    # rewritten when something was parsed or an image went away
+    if cache_path and (parsed or len(seen) != len(known)):
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = cache_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(seen, indent=1, sort_keys=True))
+        tmp.replace(cache_path)
+
+    return sizes
+
+
+def image_size(path):
+    # (width, height) as displayed, or None for formats or files we can't read
+    with open(path, "rb") as f:
+        head = f.read(32)
+        try:
+            if head.startswith(b"\x89PNG\r\n\x1a\n") and head[12:16] == b"IHDR":
+                return struct.unpack(">II", head[16:24])
+            if head[:6] in (b"GIF87a", b"GIF89a"):
+                return struct.unpack("<HH", head[6:10])
+            if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+                return _webp_size(head)
+            if head[:2] == b"\xff\xd8":
+                f.seek(2)
+                return _jpeg_size(f)
+        except struct.error:
+            pass
+
+    return None
+
+
+def _webp_size(head):
+    # slicing a truncated header wouldn't fail, it would read sizes out of
+    # nothing, so check the size fields are all there first
+    chunk = head[12:16]
+    if len(head) < WEBP_HEADER_SIZES.get(chunk, 0):
+        return None
+
+    if chunk == b"VP8 " and head[23:26] == b"\x9d\x01\x2a":
+        w, h = struct.unpack("<HH", head[26:30])
+        return w & 0x3FFF, h & 0x3FFF
+    if chunk == b"VP8L" and head[20] == 0x2F:
+        bits = int.from_bytes(head[21:25], "little")
+        return (bits & 0x3FFF) + 1, (bits >> 14 & 0x3FFF) + 1
+    if chunk == b"VP8X":
+        w = int.from_bytes(head[24:27], "little") + 1
+        h = int.from_bytes(head[27:30], "little") + 1
+        return w, h
+    return None
+
+
+def _jpeg_size(f):
+    orientation = 1
+    while True:
+        byte = f.read(1)
+        if not byte:
+            return None
+        if byte != b"\xff":
+            continue
+
+        marker = f.read(1)
+        while marker == b"\xff":  # fill bytes
+            marker = f.read(1)
+        if not marker:
+            return None
+
+        marker = marker[0]
+        if marker == 0xD9 or marker == 0xDA:  # end of image, start of scan
+            return None
+        if 0xD0 <= marker <= 0xD7 or marker == 0x01:  # no length
+            continue
+
+        (length,) = struct.unpack(">H", f.read(2))
+        data = f.read(length - 2)
+        if marker == 0xE1 and data.startswith(b"Exif\0\0"):
+            orientation = _exif_orientation(data[6:]) or orientation
+        elif marker in SOF_MARKERS:
+            h, w = struct.unpack(">HH", data[1:5])
+            # orientations 5-8 rotate by 90 degrees, and browsers apply them
+            return (h, w) if orientation >= 5 else (w, h)
+
+
+def _exif_orientation(tiff):
+    order = {b"II": "<", b"MM": ">"}.get(tiff[:2])
+    if order is None:
+        return None
+
+    (offset,) = struct.unpack(order + "I", tiff[4:8])
+    (count,) = struct.unpack(order + "H", tiff[offset : offset + 2])
+    for i in range(count):
+        entry = tiff[offset + 2 + i * 12 : offset + 14 + i * 12]
+        tag, _, _, value = struct.unpack(order + "HHIH", entry[:10])
+        if tag == 0x0112:
+            return value
+
+    return None
@@ -0,0 +1,127 @@
+import posixpath
+
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from urllib.parse import unquote, urlsplit
+
+from assets import iter_files
+
+
+# set in process pool workers by init_worker
+_worker_routes = None
+
+
+class RouteIndex:
+    # every url the site serves, mapped to the heading anchors of the page
+    # there, or None for static files, whose fragments can't be checked
+    def __init__(self):
+        self.routes = {}
+
+    def __len__(self):
+        return len(self.routes)
+
+    def add_page(self, url, anchors):
+        anchors = frozenset(anchors)
+        self.routes[url] = anchors
+        if url.endswith("/"):
+            # /blog/ is also served as /blog/index.html, and /blog redirects
+            self.routes[url + "index.html"] = anchors
+            if url != "/":
+                self.routes[url.rstrip("/")] = anchors
+
+    def add_file(self, url):
+        self.routes[url] = None
+
+    def add_static_dir(self, root):
+        root = Path(root)
+        for p in iter_files(root):
+            self.add_file(f"/{p.relative_to(root).as_posix()}")
+
+    def check(self, page_url, href):
+        # why href, as written on the page at page_url, doesn't resolve, or
+        # None if it does or isn't a link into the site
+        parts = urlsplit(href)
+        if parts.scheme or parts.netloc:
+            return None
+
+        path = unquote(parts.path)
+        if not path:
+            path = page_url
+        elif not path.startswith("/"):
+            base = page_url if page_url.endswith("/") else posixpath.dirname(page_url)
+            trailing = "/" if path.endswith("/") else ""
+            path = posixpath.normpath(posixpath.join(base, path)).rstrip("/")
+            path = path + trailing if path else "/"
+
+        if path not in self.routes:
+            return "no such page or file"
+        anchors = self.routes[path]
+        if parts.fragment and anchors is not None and parts.fragment not in anchors:
+            return f"no heading #{parts.fragment}"
+        return None
+
+
+def check_links(pages, routes, jobs=1):
+    # pages are (src_path, url, info dict) tuples; returns the broken
+    # references as (src_path, line, kind, href, reason), in page order
+    if jobs > 1 and len(pages) > 1:
+        chunksize = max(1, len(pages) // (jobs * 4))
+        with ProcessPoolExecutor(
+            min(jobs, len(pages)), initializer=init_worker, initargs=(routes,)
+        ) as pool:
+            results = pool.map(check_page, pages, chunksize=chunksize)
+            broken = [b for result in results for b in result]
+    else:
+        broken = [b for page in pages for b in check_page(page, routes)]
+
+    checked = sum(len(p[2]["links"]) + len(p[2]["images"]) for p in pages)
+    for src_path, line, kind, href, reason in broken:
+        location = f"{src_path}:{line}" if line else str(src_path)
+        print(f"[ERROR] {location}: broken {kind} {href!r}: {reason}")
+    print(
+        f"[INFO] Checked {checked} link(s) on {len(pages)} page(s) against "
+        f"{len(routes)} routes: {len(broken)} broken"
+    )
+    return broken
+
+
+def init_worker(routes):
+    global _worker_routes
+    _worker_routes = routes
+
+
+def check_page(page, routes=None):
+    routes = _worker_routes if routes is None else routes
+    src_path, url, info = page
+    refs = [("link", href) for href in info["links"]]
+    refs += [("image", image["src"]) for image in info["images"]]
+
+    broken = []
+    for kind, href in refs:
+        reason = routes.check(url, href)
+        if reason:
+            broken.append((kind, href, reason))
+    if not broken:
+        return []
+
+    # only pages with broken links are read again, to point at the lines
+    lines = find_lines(src_path, {href for _, href, _ in broken})
+    seen = {}
+    result = []
+    for kind, href, reason in broken:
+        n = seen[href] = seen.get(href, -1) + 1
+        found = lines.get(href, [])
+        line = found[n] if n < len(found) else None
+        result.append((str(src_path), line, kind, href, reason))
+    return result
+
+
+def find_lines(src_path, hrefs):
+    # the line of each "(href" in the markdown source, in order, so the nth
+    # time a page links to href is matched with the nth line that has it
+    lines = {}
+    with open(src_path) as f:
+        for i, text in enumerate(f, 1):
+            for href in hrefs:
+                lines.setdefault(href, []).extend([i] * text.count(f"({href}"))
+    return lines
@@ -1,43 +1,582 @@
+import argparse
+import os
 import re
 import shutil
+import sys
+import time
 
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from itertools import repeat
 from pathlib import Path
 
-from text_node import markdown_to_html_node
+from assets import FINGERPRINTED, AssetMap, local_path, sync_dir
+from block_cache import BlockCache
+from compress import compress_dir, prune_compressed
+from images import scan_images
+from links import RouteIndex, check_links
+from manifest import Manifest, generator_hash
+from page_info import PageInfo
+from profiler import BuildProfile, PageTimer
+from search import SearchIndex, page_url
+from template import load_template, parse_front_matter, read_front_matter
+from text_node import iter_html_blocks, parse_markdown
+from tree_cache import TreeCache
+from writer import Writer, write_file
+from watch import watch
+
+
+MANIFEST_PATH = ".cache/manifest.json"
+BLOCK_CACHE_PATH = ".cache/blocks.json"
+IMAGE_CACHE_PATH = ".cache/images.json"
+SEARCH_CACHE_PATH = ".cache/search.json"
+TREE_CACHE_PATH = ".cache/trees"
+CONTENT_DIR = "content"
+STATIC_DIR = "static"
+PUBLIC_DIR = "public"
+SEARCH_DIR = "public/search"
+TEMPLATE_PATH = "content/template.html"
+# pages bigger than this are parsed and written block by block instead of
+# being read and rendered in one go
+STREAM_THRESHOLD = 16 << 20
+
+# set in process pool workers by init_worker
+_worker_cache = None
+_worker_assets = None
+_worker_trees = None
 
 
 def main():
-    copy_dir("static", "public")
-    generate_pages_recursive("content", "content/template.html", "public")
+    parser = argparse.ArgumentParser(description="Static site generator")
+    parser.add_argument(
+        "--clean", action="store_true", help="Delete the output and rebuild everything"
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="Number of processes used to render pages (0 = one per CPU)",
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="Keep running and rebuild whenever content or static files change",
+    )
+    parser.add_argument(
+        "--checksum",
+        action="store_true",
+        help="Compare static files by content when their mtime differs",
+    )
+    parser.add_argument(
+        "--link",
+        action="store_true",
+        help="Hardlink static files into the output instead of copying them",
+    )
+    parser.add_argument(
+        "--gzip",
+        action="store_true",
+        help="Write a precompressed .gz next to every compressible output",
+    )
+    parser.add_argument(
+        "--fingerprint",
+        action="store_true",
+        help="Also copy static assets under content-hashed names and point pages "
+        "and templates at those",
+    )
+    parser.add_argument(
+        "--search",
+        action="store_true",
+        help=f"Write a sharded full-text search index to {SEARCH_DIR!r}",
+    )
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="Report links and images that point at pages or files the site "
+        "doesn't have, and fail the build if there are any",
+    )
+    parser.add_argument(
+        "--profile",
+        type=Path,
+        metavar="TRACE",
+        help="Time every build stage per page, print a summary and save it as JSON",
+    )
+    parser.add_argument(
+        "--explain",
+        action="store_true",
+        help="Print why each page is rebuilt instead of kept from the last build",
+    )
+    parser.add_argument(
+        "--block-cache",
+        type=int,
+        default=10_000,
+        metavar="N",
+        help="Reuse the HTML of up to N repeated blocks (0 = disabled)",
+    )
+    parser.add_argument(
+        "--tree-cache",
+        type=int,
+        default=256,
+        metavar="MB",
+        help=f"Keep up to MB of parsed pages in {TREE_CACHE_PATH!r}, so pages "
+        "whose markdown didn't change aren't parsed again (0 = disabled)",
+    )
+    parser.add_argument(
+        "--persist-block-cache",
+        action="store_true",
+        help=f"Keep the block cache in {BLOCK_CACHE_PATH!r} between builds",
+    )
+    args = parser.parse_args()
+
+    # hash the generator once: in watch mode the running code is what counts,
+    # not whatever is on disk by the time a rebuild happens
+    generator = generator_hash(TEMPLATE_PATH)
+    args.jobs = args.jobs or os.cpu_count()
+
+    if args.clean and Path(PUBLIC_DIR).exists():
+        shutil.rmtree(PUBLIC_DIR, ignore_errors=True)
+        print(f"[INFO] Deleted dir {PUBLIC_DIR!r}")
+
+    broken = build(generator, args, clean=args.clean)
+    if broken and not args.watch:
+        sys.exit(1)
+
+    if args.watch:
+        print(f"[INFO] Watching {CONTENT_DIR!r} and {STATIC_DIR!r} for changes")
+        watch(
+            [CONTENT_DIR, STATIC_DIR],
+            lambda changed: rebuild_changed(changed, generator, args),
+        )
+
+
+def build(generator, args, clean=False):
+    manifest = Manifest(MANIFEST_PATH, generator)
+    if clean:
+        manifest.previous = {}
+        manifest.previous_assets = set()
+
+    profile = BuildProfile() if args.profile else None
+    search = SearchIndex(SEARCH_CACHE_PATH) if args.search else None
+    cache = None
+    trees = None
+    broken = []
+    try:
+        urls = sync_dir(
+            STATIC_DIR, PUBLIC_DIR, manifest, args.checksum, args.link, args.fingerprint
+        )
+        sizes = scan_images(STATIC_DIR, manifest, IMAGE_CACHE_PATH)
+        # fingerprinted urls and image sizes only matter to the pages and
+        # cached blocks that refer to those files, see local_assets(), but
+        # turning fingerprinting on or off changes every page
+        assets = AssetMap(urls, sizes)
+        if args.fingerprint:
+            manifest.generator = f"{generator}-fingerprint"
 
+        if args.block_cache > 0:
+            path = BLOCK_CACHE_PATH if args.persist_block_cache else None
+            cache = BlockCache(
+                args.block_cache, path=path, namespace=manifest.generator
+            )
+        if args.tree_cache > 0:
+            # a clean build parses every page, and so does a profiled one, or
+            # the profile would only show the time spent loading trees
+            trees = TreeCache(
+                TREE_CACHE_PATH,
+                args.tree_cache << 20,
+                refresh=bool(clean or args.profile),
+            )
 
-def generate_pages_recursive(src_dir, template_path, dest_dir):
-    for p in Path(src_dir).iterdir():
+        generate_pages_recursive(
+            CONTENT_DIR,
+            TEMPLATE_PATH,
+            PUBLIC_DIR,
+            manifest,
+            args.jobs,
+            profile,
+            cache,
+            args.explain,
+            assets,
+            search,
+            trees,
+        )
+        prune_outputs(manifest.stale_outputs(), PUBLIC_DIR)
+        if args.check:
+            broken = check_site(
+                CONTENT_DIR, STATIC_DIR, PUBLIC_DIR, manifest, args.jobs
+            )
+        if search:
+            search.write(SEARCH_DIR)
+        if args.gzip:
+            compress_dir(PUBLIC_DIR, args.jobs)
+        elif deleted := prune_compressed(PUBLIC_DIR):
+            print(f"[INFO] Deleted {deleted} outdated .gz file(s)")
+    finally:
+        manifest.save()
+        if search:
+            search.save()
+        if cache:
+            cache.save()
+            print(f"[INFO] Block cache: {cache.stats()}")
+        if trees:
+            trees.prune()
+
+    if profile:
+        print(profile.summary())
+        profile.save(args.profile)
+        print(f"[INFO] Wrote build profile to {str(args.profile)!r}")
+
+    return broken
+
+
+def rebuild_changed(changed, generator, args):
+    print(f"[INFO] {len(changed)} file(s) changed, rebuilding")
+    try:
+        build(generator, args)
+    except Exception as e:
+        # keep watching: the next save will most likely fix it
+        print(f"[ERROR] Rebuild failed: {e!r}")
+
+
+def find_pages(src_dir, dest_dir):
+    for p in sorted(Path(src_dir).iterdir()):
         dest_name = Path(dest_dir).joinpath(p.name)
         if p.is_dir():
-            generate_pages_recursive(p, template_path, dest_name)
+            yield from find_pages(p, dest_name)
         elif p.is_file() and p.suffix == ".md":
-            generate_page(p, template_path, dest_name.with_suffix(".html"))
+            yield p, dest_name.with_suffix(".html")
+
+
+def generate_pages_recursive(
+    src_dir,
+    template_path,
+    dest_dir,
+    manifest=None,
+    jobs=1,
+    profile=None,
+    cache=None,
+    explain=False,
+    assets=None,
+    search=None,
+    trees=None,
+):
+    pages = []
+    kept = 0
+    for src_path, dest_path in find_pages(src_dir, dest_dir):
+        reason = manifest.stale_reason(dest_path) if manifest else "no manifest"
+        if reason is None and search is not None:
+            deps = manifest.previous[str(dest_path)]["deps"]
+            if not search.is_current(dest_path, deps):
+                reason = "search index out of date"
+        if reason is None:
+            manifest.keep(dest_path)
+            if search is not None:
+                search.keep(dest_path)
+            kept += 1
+            continue
+
+        pages.append((src_path, template_path, dest_path))
+        if explain:
+            print(f"[EXPLAIN] Rebuilding {str(dest_path)!r}: {reason}")
+
+    if explain:
+        print(f"[EXPLAIN] {len(pages)} page(s) to rebuild, {kept} up to date")
+
+    def done(page, result, timer):
+        deps, info = result
+        if manifest:
+            manifest.record(page[2], deps, info.to_dict())
+        if search is not None:
+            url = page_url(page[2], dest_dir)
+            deps = manifest.pages[str(page[2])]["deps"] if manifest else None
+            search.add(page[2], url, info.title, info.terms, deps)
+        if profile:
+            profile.record(page[0], timer)
+
+    if not pages:
+        return
+
+    rendered = []
+    try:
+        # pages are written by the writer's threads while the next ones render
+        with Writer() as writer:
+            render_pages(pages, jobs, profile, cache, assets, trees, writer, rendered)
+    finally:
+        # only pages that made it to disk are recorded, so one whose write
+        # failed is built again next time
+        for page, result, timer, future in rendered:
+            if future is None or future.exception() is None:
+                done(page, result, timer)
+
+
+def render_pages(pages, jobs, profile, cache, assets, trees, writer, rendered):
+    # renders pages and queues them with writer, appending a (page, result,
+    # timer, write future) to rendered for each one
+    def write(page, html, result, timer):
+        start = time.perf_counter()
+        future = writer.write(page[2], html) if html is not None else None
+        if timer:
+            # this only waits when too many pages are queued already
+            timer.add("write", time.perf_counter() - start)
+        rendered.append((page, result, timer, future))
+
+    if jobs > 1 and len(pages) > 1:
+        # each worker gets its own copy of the block cache and sends back
+        # what it added, so entries survive into the next build
+        init_args = (
+            cache.options() if cache else None,
+            assets,
+            trees.options() if trees else None,
+        )
+        with ProcessPoolExecutor(
+            min(jobs, len(pages)), initializer=init_worker, initargs=init_args
+        ) as pool:
+            # results (and the first error) come back in discovery order,
+            # so the log and the raised exception don't depend on
+            # scheduling; workers only render, and the html they send
+            # back is written here
+            chunksize = max(1, len(pages) // (jobs * 4))
+            tasks = [*zip(*pages), repeat(profile is not None)]
+            results = pool.map(build_page_task, *tasks, chunksize=chunksize)
+            for page, (html, result, timer, cache_stats) in zip(pages, results):
+                log_page(*page)
+                if cache:
+                    cache.merge(cache_stats)
+                write(page, html, result, timer)
+    else:
+        for page in pages:
+            log_page(*page)
+            timer = PageTimer() if profile else None
+            html, *result = render_page(*page, timer, cache, assets, trees)
+            write(page, html, result, timer)
+
+
+def check_site(src_dir, static_dir, dest_dir, manifest, jobs=1):
+    # every page's links are in the manifest, rebuilt or not, so the whole
+    # site is checked without parsing anything again
+    routes = RouteIndex()
+    routes.add_static_dir(static_dir)
+    pages = []
+    for src_path, dest_path in find_pages(src_dir, dest_dir):
+        url = page_url(dest_path, dest_dir)
+        info = manifest.pages[str(dest_path)]["info"]
+        routes.add_page(url, (h["anchor"] for h in info["headings"]))
+        pages.append((src_path, url, info))
+
+    return check_links(pages, routes, jobs)
+
+
+def prune_outputs(paths, root):
+    root = Path(root)
+    for p in map(Path, paths):
+        if p.is_file():
+            p.unlink()
+            print(f"[INFO] Deleted stale output {str(p)!r}")
+
+        # drop directories left empty by the deleted page, but never the root
+        for parent in p.parents:
+            if parent == root or root not in parent.parents:
+                break
+            if not parent.is_dir() or any(parent.iterdir()):
+                break
+            parent.rmdir()
 
 
 def generate_page(src_path, template_path, dest_path):
+    log_page(src_path, template_path, dest_path)
+    return build_page(src_path, template_path, dest_path)
+
+
+def log_page(src_path, template_path, dest_path):
     print(
         f"[INFO] Generating page from {str(src_path)!r} -> {str(dest_path)!r} using {str(template_path)!r}"
     )
 
+
+def build_page(
+    src_path,
+    template_path,
+    dest_path,
+    timer=None,
+    cache=None,
+    assets=None,
+    trees=None,
+):
+    html, deps, info = render_page(
+        src_path, template_path, dest_path, timer, cache, assets, trees
+    )
+    if html is not None:
+        start = time.perf_counter()
+        Path(dest_path).parent.mkdir(parents=True, exist_ok=True)
+        write_file(dest_path, html)
+        if timer:
+            timer.add("write", time.perf_counter() - start)
+
+    return deps, info
+
+
+def render_page(
+    src_path,
+    template_path,
+    dest_path,
+    timer=None,
+    cache=None,
+    assets=None,
+    trees=None,
+):
+    # the page's html, or None for big pages that were streamed straight to
+    # dest_path, along with its deps and PageInfo
     src_path = Path(src_path)
     template_path = Path(template_path)
     dest_path = Path(dest_path)
 
-    src = src_path.read_text()
-    template = template_path.read_text()
+    if src_path.stat().st_size > STREAM_THRESHOLD:
+        with timer.stage("stream") if timer else nullcontext():
+            deps, info = stream_page(src_path, template_path, dest_path, cache, assets)
+            return None, deps, info
+
+    template, values, deps, info = load_page(
+        src_path, template_path, timer, cache, assets, trees
+    )
+    with timer.stage("to_html") if timer else nullcontext():
+        html = template.render(values).encode()
+
+    return html, deps, info
+
+
+def load_page(src_path, template_path, timer=None, cache=None, assets=None, trees=None):
+    # everything needed to render a page, without rendering it yet: the
+    # template, the values for its slots, the files the page depends on and
+    # its PageInfo
+    src_path = Path(src_path)
+    stage = timer.stage if timer else lambda name: nullcontext()
+
+    with stage("read"):
+        meta, markdown = parse_front_matter(src_path.read_text())
+
+    with stage("template"):
+        template_path = page_template(meta, Path(template_path))
+        template = load_template(template_path, assets)
+
+    tree = None
+    if trees and not trees.refresh:
+        with stage("load_tree"):
+            tree = trees.get(markdown, assets)
+    if tree is None:
+        tree = parse_markdown(markdown, timer, cache, assets)
+        if trees:
+            with stage("save_tree"):
+                trees.put(markdown, *tree, assets)
+    node, info = tree
+    title = info.title = meta.get("title") or page_title(info)
+
+    values = {**meta, "title": title, "content": node}
+    deps = [src_path, *template.deps, *local_assets(info, template)]
+    return template, values, deps, info
+
+
+def stream_page(src_path, template_path, dest_path, cache=None, assets=None):
+    with src_path.open() as src:
+        meta, lines = read_front_matter(src)
+        template_path = page_template(meta, template_path)
+        template = load_template(template_path, assets)
+        info = PageInfo()
+        blocks = iter_html_blocks(lines, cache, assets, info)
+
+        # the title is needed before any of the content is written, so hold
+        # on to the blocks up to the first h1
+        title = meta.get("title")
+        head = []
+        if not title:
+            for node in blocks:
+                head.append(node)
+                if node.tag == "h1":
+                    break
+            title = page_title(info)
+        info.title = title
+
+        content = iter_content(head, blocks, check_title=not meta.get("title"))
+        dest_path.parent.mkdir(parents=True, exist_ok=True)
+        # an error halfway through must not leave a truncated page behind
+        tmp = dest_path.with_name(f".{dest_path.name}.tmp")
+        try:
+            with tmp.open("w") as f:
+                template.write(f, {**meta, "title": title, "content": content})
+        except BaseException:
+            tmp.unlink(missing_ok=True)
+            raise
+
+        tmp.replace(dest_path)
+
+    return [src_path, *template.deps, *local_assets(info, template)], info
 
-    html = markdown_to_html_node(src).to_html()
-    title = extract_title(html)
-    formatted = template.replace("{{ title }}", title).replace("{{ content }}", html)
 
-    dest_path.parent.mkdir(parents=True, exist_ok=True)
-    dest_path.write_text(formatted)
+def local_assets(info, template):
+    # the static files whose size or fingerprinted url is written into the
+    # page: its images, and files it or its template link to that get
+    # fingerprinted; the page is rebuilt when one of them changes, or appears
+    urls = [image["src"] for image in info.images]
+    for url in (*info.links, *template.urls):
+        path = local_path(url)[0]
+        if path and Path(path).suffix in FINGERPRINTED:
+            urls.append(url)
+
+    paths = {}
+    for url in urls:
+        path = local_path(url)[0]
+        if path:
+            paths[Path(STATIC_DIR, path.lstrip("/"))] = None
+
+    return list(paths)
+
+
+def iter_content(head, blocks, check_title=False):
+    yield "<div>"
+    for node in head:
+        yield from node.iter_html()
+    for node in blocks:
+        if check_title and node.tag == "h1":
+            raise ValueError("Too many titles found")
+        yield from node.iter_html()
+    yield "</div>"
+
+
+def page_template(meta, template_path):
+    if "template" in meta:
+        return template_path.parent.joinpath(meta["template"])
+    return template_path
+
+
+def init_worker(cache_options, assets, tree_options=None):
+    global _worker_cache, _worker_assets, _worker_trees
+    if cache_options is not None:
+        _worker_cache = BlockCache(**cache_options)
+    if tree_options is not None:
+        _worker_trees = TreeCache(**tree_options)
+    _worker_assets = assets
+
+
+def build_page_task(src_path, template_path, dest_path, profile=False):
+    timer = PageTimer() if profile else None
+    html, *result = render_page(
+        src_path,
+        template_path,
+        dest_path,
+        timer,
+        _worker_cache,
+        _worker_assets,
+        _worker_trees,
+    )
+    return html, result, timer, _worker_cache and _worker_cache.drain()
+
+
+def page_title(info):
+    h1s = [h["text"] for h in info.headings if h["level"] == 1]
+    if not h1s:
+        raise ValueError("No title found")
+    elif len(h1s) >= 2:
+        raise ValueError("Too many titles found")
+    else:
+        return h1s[0].title()
 
 
 def extract_title(html):
@@ -50,25 +589,5 @@ def extract_title(html):
         return h1_tags[0].title()
 
 
-def copy_dir(src, dest):
-    dest = Path(dest)
-    if dest.exists():
-        shutil.rmtree(dest, ignore_errors=True)
-        print(f"[INFO] Deleted dir {str(dest)!r}")
-
-    dest.mkdir()
-    print(f"[INFO] Created dir {str(dest)!r}")
-
-    for p in Path(src).iterdir():
-        dest_p = dest.joinpath(p.name)
-
-        if p.is_file():
-            shutil.copyfile(p, dest_p)
-            print(f"[INFO] Copied {str(p)!r} to {str(dest_p)!r}")
-        else:
-            copy_dir(p, dest_p)
-
-
 if __name__ == "__main__":
     main()
-
@@ -0,0 +1,138 @@
+import hashlib
+import json
+
+from pathlib import Path
+
+
+# the modules that decide what a built page looks like; editing one of them
+# rebuilds every page, editing tooling like the server or benchmark doesn't
+GENERATOR_MODULES = (
+    "main.py",
+    "text_node.py",
+    "html_node.py",
+    "page_info.py",
+    "template.py",
+    "assets.py",
+    "images.py",
+    "block_cache.py",
+    "tree_cache.py",
+    "manifest.py",
+)
+
+
+def file_hash(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(1 << 20):
+            h.update(chunk)
+
+    return h.hexdigest()
+
+
+def generator_hash(*config):
+    h = hashlib.sha256()
+    src = Path(__file__).parent
+    for name in GENERATOR_MODULES:
+        h.update(name.encode())
+        h.update(src.joinpath(name).read_bytes())
+
+    h.update(json.dumps(config, default=str).encode())
+    return h.hexdigest()
+
+
+def stat_key(path):
+    st = Path(path).stat()
+    return [st.st_mtime_ns, st.st_size]
+
+
+class Manifest:
+    VERSION = 4
+
+    def __init__(self, path, generator):
+        self.path = Path(path)
+        self.generator = generator
+        self.previous_generator = None
+        self.previous = {}
+        self.pages = {}
+        self.files = {}
+        self.assets = set()
+        self.previous_assets = set()
+        self._known_files = {}
+
+        if self.path.exists():
+            data = json.loads(self.path.read_text())
+            if data.get("version") == self.VERSION:
+                self.previous = data["pages"]
+                self.previous_generator = data["generator"]
+                self._known_files = data["files"]
+                self.previous_assets = set(data["assets"])
+
+    @property
+    def generator_changed(self):
+        return self.generator != self.previous_generator
+
+    def hash(self, path):
+        key = str(path)
+        if key not in self.files:
+            # trust the previous hash while the file's mtime and size are unchanged
+            st = stat_key(path)
+            known = self._known_files.get(key)
+            h = known[2] if known and known[:2] == st else file_hash(path)
+            self.files[key] = [*st, h]
+
+        return self.files[key][2]
+
+    def is_fresh(self, dest_path):
+        return self.stale_reason(dest_path) is None
+
+    def stale_reason(self, dest_path):
+        entry = self.previous.get(str(dest_path))
+        if entry is None:
+            return "new page"
+        if self.generator_changed:
+            return "generator or config changed"
+        if not Path(dest_path).exists():
+            return "output missing"
+
+        for dep, h in entry["deps"].items():
+            exists = Path(dep).is_file()
+            # None for files the page refers to that didn't exist yet
+            if h is None:
+                if exists:
+                    return f"{dep!r} added"
+                continue
+            if not exists:
+                return f"{dep!r} deleted"
+            if self.hash(dep) != h:
+                return f"{dep!r} changed"
+
+        return None
+
+    def keep(self, dest_path):
+        self.pages[str(dest_path)] = self.previous[str(dest_path)]
+
+    def record(self, dest_path, deps, info=None):
+        # info is the page's PageInfo as a dict, kept so site-wide features
+        # don't have to parse pages that weren't rebuilt
+        deps = {str(d): self.hash(d) if Path(d).is_file() else None for d in deps}
+        self.pages[str(dest_path)] = {"deps": deps, "info": info}
+
+    def stale_outputs(self):
+        return sorted(p for p in self.previous if p not in self.pages)
+
+    def stale_assets(self):
+        return sorted(self.previous_assets - self.assets)
+
+    def save(self):
+        data = {
+            "version": self.VERSION,
+            "generator": self.generator,
+            "pages": self.pages,
+            "files": self.files,
+            "assets": sorted(self.assets),
+        }
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(data, indent=1, sort_keys=True))
+        tmp.replace(self.path)
@@ -0,0 +1,102 @@
+import re
+
+
+SLUG_STRIP = re.compile(r"[^\w\s-]")
+SLUG_SPACE = re.compile(r"[\s-]+")
+# what the search index is built from: words of 2 to 40 letters or digits
+TERM = re.compile(r"\b\w{2,40}\b")
+
+
+class PageInfo:
+    # what a page contains, collected while its blocks are rendered: the
+    # heading outline, outbound links, images, a word count and how often each
+    # search term appears
+    __slots__ = ("title", "headings", "links", "images", "words", "terms", "_anchors")
+
+    def __init__(self):
+        self.title = None
+        self.headings = []
+        self.links = []
+        self.images = []
+        self.words = 0
+        self.terms = {}
+        self._anchors = set()
+
+    @classmethod
+    def from_dict(cls, data):
+        info = cls()
+        info.title = data["title"]
+        info.headings = data["headings"]
+        info.links = data["links"]
+        info.images = data["images"]
+        info.words = data["words"]
+        info.terms = data.get("terms", {})
+        info._anchors = {h["anchor"] for h in info.headings}
+        return info
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self.to_dict()!r})"
+
+    def add_heading(self, level, text):
+        # unique within the page, like GitHub: intro, intro-1, intro-2, ...
+        base = slugify(text) or "section"
+        anchor = base
+        n = 0
+        while anchor in self._anchors:
+            n += 1
+            anchor = f"{base}-{n}"
+
+        self._anchors.add(anchor)
+        self.headings.append({"level": level, "text": text, "anchor": anchor})
+        return anchor
+
+    def add_block(self, info):
+        self.links.extend(info["links"])
+        self.images.extend(info["images"])
+        self.words += info["words"]
+        for term, n in info["terms"].items():
+            self.terms[term] = self.terms.get(term, 0) + n
+
+    def to_dict(self):
+        # without the terms, which only the search index needs, see search.py
+        return {
+            "title": self.title,
+            "headings": self.headings,
+            "links": self.links,
+            "images": self.images,
+            "words": self.words,
+        }
+
+
+def block_info(node):
+    # the part of a PageInfo that one block contributes, in a form that can be
+    # cached with the block's html
+    info = {"links": [], "images": [], "words": 0, "terms": {}}
+    terms = info["terms"]
+    stack = [node]
+    while stack:
+        n = stack.pop()
+        if n.tag == "a" and "href" in n.props:
+            info["links"].append(n.props["href"])
+        elif n.tag == "img" and "src" in n.props:
+            info["images"].append(
+                {"src": n.props["src"], "alt": n.props.get("alt", "")}
+            )
+        if n.value:
+            info["words"] += len(n.value.split())
+            for term in TERM.findall(n.value.lower()):
+                terms[term] = terms.get(term, 0) + 1
+        stack.extend(reversed(n.children))
+
+    return info
+
+
+def node_text(node):
+    if not node.children:
+        return node.value or ""
+    return "".join(map(node_text, node.children))
+
+
+def slugify(text):
+    text = SLUG_STRIP.sub("", text.lower())
+    return SLUG_SPACE.sub("-", text).strip("-")
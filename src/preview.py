@@ -0,0 +1,82 @@
+import os
+import posixpath
+import threading
+
+from collections import OrderedDict
+from pathlib import Path
+from urllib.parse import unquote
+
+from block_cache import BlockCache
+from main import load_page
+
+
+class PreviewSite:
+    # renders pages straight from the content dir when they're requested,
+    # keeping the html in memory until one of the page's files changes
+    def __init__(self, content_dir, template_path, max_pages=1000):
+        self.content_dir = Path(content_dir)
+        self.template_path = Path(template_path)
+        self.max_pages = max_pages
+        self.pages = OrderedDict()
+        self.cache = BlockCache()
+        self.lock = threading.Lock()
+
+    def find_page(self, url_path):
+        # the same mapping as find_pages(): content/a/b.md is /a/b.html
+        path = content_path(url_path)
+        if url_path.endswith("/"):
+            path = posixpath.join(path, "index.html")
+        if not path.endswith(".html"):
+            return None
+
+        src = self.content_dir.joinpath(path).with_suffix(".md")
+        return src if src.is_file() else None
+
+    def is_section(self, url_path):
+        # a page directory asked for without its trailing slash
+        path = content_path(url_path)
+        return self.content_dir.joinpath(path, "index.md").is_file()
+
+    def render(self, src):
+        with self.lock:
+            cached = self.pages.get(src)
+            if cached and cached[0] == signature(cached[0]):
+                self.pages.move_to_end(src)
+                return cached[1]
+
+            before = signature([src])
+            template, values, deps, _ = load_page(
+                src, self.template_path, None, self.cache
+            )
+            html = template.render(values).encode()
+
+            # a page saved while it was being read would be cached as the
+            # newer version, so leave it to be rendered again next time
+            sig = signature(dict.fromkeys(deps))
+            if sig[src] != before[src]:
+                return html
+
+            self.pages[src] = (sig, html)
+            self.pages.move_to_end(src)
+            while len(self.pages) > self.max_pages:
+                self.pages.popitem(last=False)
+
+            return html
+
+
+def content_path(url_path):
+    # normalized from the root, so ".." can't climb out of the content dir
+    # even when the request target doesn't start with a slash
+    return posixpath.normpath("/" + unquote(url_path)).lstrip("/")
+
+
+def signature(paths):
+    sig = {}
+    for p in paths:
+        try:
+            st = os.stat(p)
+            sig[p] = (st.st_mtime_ns, st.st_size)
+        except FileNotFoundError:
+            sig[p] = None
+
+    return sig
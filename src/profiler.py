@@ -0,0 +1,76 @@
+import json
+import time
+
+from contextlib import contextmanager
+from pathlib import Path
+
+
+class PageTimer:
+    def __init__(self):
+        self.stages = {}
+        self.counts = {}
+
+    def add(self, stage, seconds):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+        self.counts[stage] = self.counts.get(stage, 0) + 1
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+
+class BuildProfile:
+    def __init__(self):
+        self.pages = {}
+
+    def record(self, page, timer):
+        self.pages[str(page)] = {"stages": timer.stages, "counts": timer.counts}
+
+    def page_total(self, page):
+        return sum(self.pages[page]["stages"].values())
+
+    def slowest_pages(self, n=10):
+        return sorted(self.pages, key=self.page_total, reverse=True)[:n]
+
+    def stage_totals(self):
+        totals = {}
+        for page in self.pages.values():
+            for stage, seconds in page["stages"].items():
+                count, total = totals.get(stage, (0, 0.0))
+                totals[stage] = (count + page["counts"][stage], total + seconds)
+
+        return dict(sorted(totals.items(), key=lambda kv: kv[1][1], reverse=True))
+
+    def summary(self, n=10):
+        lines = [
+            f"[PROFILE] Slowest {min(n, len(self.pages))} of {len(self.pages)} pages:"
+        ]
+        for page in self.slowest_pages(n):
+            stages = self.pages[page]["stages"]
+            worst = max(stages, key=stages.get)
+            lines.append(
+                f"  {self.page_total(page) * 1000:9.2f} ms  {page}"
+                f"  (mostly {worst}: {stages[worst] * 1000:.2f} ms)"
+            )
+
+        lines.append("[PROFILE] Time per stage and block type:")
+        for stage, (count, seconds) in self.stage_totals().items():
+            mean = seconds / count * 1e6
+            lines.append(
+                f"  {seconds * 1000:9.2f} ms  {stage:<24} {count:>8}x  {mean:9.1f} us each"
+            )
+
+        return "\n".join(lines)
+
+    def save(self, path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        totals = {
+            s: {"count": c, "seconds": t} for s, (c, t) in self.stage_totals().items()
+        }
+        data = {"pages": self.pages, "stages": totals}
+        path.write_text(json.dumps(data, indent=1))
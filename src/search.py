@@ -0,0 +1,116 @@
+import hashlib
+import json
+
+from pathlib import Path
+
+
+# terms are sharded by their first letters, so a query only loads the shard of
+# each word typed
+PREFIX_LENGTH = 2
+DOCS_NAME = "docs.json"
+# too common to narrow a search down, and they'd be the biggest postings
+STOP_WORDS = set(
+    "an and are as at be but by for from has have in is it its of on or that the "
+    "this to was were which with".split()
+)
+
+
+class SearchIndex:
+    # an inverted index over every page, kept per page in `path` so a build
+    # only has to tokenize the pages it rebuilds
+    VERSION = 2
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.previous = {}
+        self.pages = {}
+        self.shards = {}
+
+        if self.path.exists():
+            data = json.loads(self.path.read_text())
+            if data.get("version") == self.VERSION:
+                self.previous = data["pages"]
+                self.shards = data["shards"]
+
+    def is_current(self, dest_path, deps):
+        # indexed from the same files the page was last built from; a build
+        # without --search can rebuild the page and leave its entry behind
+        entry = self.previous.get(str(dest_path))
+        return entry is not None and entry["deps"] == deps
+
+    def add(self, dest_path, url, title, terms, deps=None):
+        # deps are the page's deps as recorded in the manifest
+        old = self.previous.get(str(dest_path))
+        self.pages[str(dest_path)] = {
+            # a page keeps its id, so one changed page only touches the shards
+            # of its own terms
+            "id": old and old["id"],
+            "url": url,
+            "title": title,
+            "terms": {t: n for t, n in terms.items() if t not in STOP_WORDS},
+            "deps": deps,
+        }
+
+    def keep(self, dest_path):
+        self.pages[str(dest_path)] = self.previous[str(dest_path)]
+
+    def write(self, out_dir):
+        out_dir = Path(out_dir)
+        out_dir.mkdir(parents=True, exist_ok=True)
+
+        # new pages take the lowest ids left free by deleted ones
+        used = {p["id"] for p in self.pages.values() if p["id"] is not None}
+        free = (i for i in range(len(self.pages) + 1) if i not in used)
+        for dest in sorted(self.pages):
+            if self.pages[dest]["id"] is None:
+                self.pages[dest]["id"] = next(free)
+
+        # ids are positions in the docs list, with holes for deleted pages
+        pages = sorted(self.pages.values(), key=lambda p: p["id"])
+        docs = [None] * (pages[-1]["id"] + 1 if pages else 0)
+        shards = {}
+        for page in pages:
+            docs[page["id"]] = [page["url"], page["title"]]
+            for term, count in page["terms"].items():
+                shard = shards.setdefault(term[:PREFIX_LENGTH], {})
+                shard.setdefault(term, []).append([page["id"], count])
+
+        files = {f"{prefix}.json": shard for prefix, shard in shards.items()}
+        files[DOCS_NAME] = {"prefix": PREFIX_LENGTH, "docs": docs}
+
+        written = 0
+        hashes = {}
+        for name, data in files.items():
+            text = json.dumps(data, separators=(",", ":"), sort_keys=True)
+            hashes[name] = hashlib.sha256(text.encode()).hexdigest()
+            path = out_dir / name
+            if self.shards.get(name) != hashes[name] or not path.is_file():
+                path.write_text(text)
+                written += 1
+
+        deleted = 0
+        for name in self.shards.keys() - hashes.keys():
+            (out_dir / name).unlink(missing_ok=True)
+            deleted += 1
+
+        self.shards = hashes
+        print(
+            f"[INFO] Search index: {len(self.pages)} pages, {len(files) - 1} shards, "
+            f"{written} written, {deleted} deleted"
+        )
+
+    def save(self):
+        data = {"version": self.VERSION, "pages": self.pages, "shards": self.shards}
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(data))
+        tmp.replace(self.path)
+
+
+def page_url(dest_path, root):
+    # a/index.html is served as /a/, but a/reindex.html is just that
+    rel = Path(dest_path).relative_to(root)
+    if rel.name == "index.html":
+        rel = rel.parent
+        return "/" if rel == Path(".") else f"/{rel.as_posix()}/"
+    return f"/{rel.as_posix()}"
@@ -0,0 +1,129 @@
+import re
+
+from itertools import chain
+from pathlib import Path
+
+
+SLOT = re.compile(r"\{\{\s*(\w+)\s*\}\}")
+PARTIAL = re.compile(r"\{\{>\s*(\S+?)\s*\}\}")
+
+_cache = {}
+
+
+class Template:
+    def __init__(self, text, deps=(), urls=()):
+        # the files this template was read from: itself and its partials
+        self.deps = list(deps)
+        # the site urls it refers to, as written, before they were rewritten
+        self.urls = list(urls)
+
+        # literal text and slots alternate: even indexes are strings, odd
+        # indexes are (name, placeholder) pairs
+        self.segments = []
+        pos = 0
+        for m in SLOT.finditer(text):
+            self.segments.append(text[pos : m.start()])
+            self.segments.append((m[1], m[0]))
+            pos = m.end()
+
+        self.segments.append(text[pos:])
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self.segments!r})"
+
+    def slots(self):
+        return {name for name, _ in self.segments[1::2]}
+
+    def iter_render(self, values):
+        yield self.segments[0]
+        for i in range(1, len(self.segments), 2):
+            name, placeholder = self.segments[i]
+            # unknown slots are left as they are, like the old str.replace did
+            value = values.get(name, placeholder)
+            if isinstance(value, str):
+                yield value
+            elif hasattr(value, "iter_html"):
+                yield from value.iter_html()
+            else:
+                # already an iterable of html chunks, e.g. a streamed page
+                yield from value
+
+            yield self.segments[i + 1]
+
+    def render(self, values):
+        return "".join(self.iter_render(values))
+
+    def write(self, fp, values):
+        fp.writelines(self.iter_render(values))
+
+
+def load_template(path, assets=None):
+    path = Path(path)
+    key = (path, assets.fingerprint if assets else None)
+    cached = _cache.get(key)
+    if cached is None or any(_stat(p) != st for p, st in cached[0].items()):
+        deps = []
+        text = read_template(path, deps)
+        urls = ()
+        if assets:
+            urls = assets.references(text)
+            text = assets.rewrite_html(text)
+        template = Template(text, dict.fromkeys(deps), urls)
+        cached = _cache[key] = ({p: _stat(p) for p in template.deps}, template)
+
+    return cached[1]
+
+
+def read_template(path, deps, including=()):
+    # {{> file }} is replaced by that file, relative to the one including it
+    real = path.resolve()
+    if real in including:
+        raise ValueError(f"Template includes itself: {str(path)!r}")
+
+    deps.append(path)
+    text = path.read_text()
+    return PARTIAL.sub(
+        lambda m: read_template(path.parent / m[1], deps, (*including, real)), text
+    )
+
+
+def _stat(path):
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def parse_front_matter(markdown):
+    if not markdown.startswith("---\n"):
+        return {}, markdown
+
+    end = markdown.find("\n---\n", 3)
+    if end == -1:
+        return {}, markdown
+
+    meta = {}
+    for line in markdown[4:end].splitlines():
+        key, sep, value = line.partition(":")
+        if sep and key.strip():
+            meta[key.strip()] = value.strip()
+
+    return meta, markdown[end + 5 :]
+
+
+def read_front_matter(lines):
+    # line by line version of parse_front_matter(), for files too big to read
+    # at once; returns the metadata and the remaining lines of the body
+    lines = iter(lines)
+    header = [next(lines, "")]
+    if header[0] != "---\n":
+        return {}, chain(header, lines)
+
+    for line in lines:
+        header.append(line)
+        if line == "---\n":
+            meta, _ = parse_front_matter("".join(header))
+            return meta, lines
+
+    return {}, iter(header)
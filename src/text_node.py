@@ -1,9 +1,11 @@
 import re
 import textwrap
+import time
 
 from enum import Enum
 
 from html_node import ParentNode, LeafNode
+from page_info import PageInfo, block_info, node_text
 
 
 class TT(Enum):
@@ -24,14 +26,38 @@ class BT(Enum):
     ORDERED_LIST = "ol"
 
 
+DELIMITERS = {"**": TT.BOLD, "*": TT.ITALIC}
+
+WHITESPACE = " \t\r\f\v"
+LINE_CONTENT = re.compile(r"[^ \t\r\f\v]")
+WHITESPACE_LINE = re.compile(r"\n[ \t\r\f\v]+(?=\n)")
+ORDERED_LIST_START = re.compile(r"\d+\.")
+
+INLINE_TOKENS = re.compile(
+    r"`(?P<code>[^`]*)`"
+    r"|!\[(?P<alt>.*?)\]\((?P<src>.*?)\)"
+    r"|\[(?P<text>.*?)\]\((?P<href>.*?)\)"
+    r"|(?P<delim>\*\*|\*|`)"
+)
+
+
 class TextNode:
+    __slots__ = ("markdown", "text_type", "url")
+
     def __init__(self, markdown, text_type, url=None):
         self.markdown = markdown
         self.text_type = text_type
         self.url = url
 
     def __eq__(self, other):
-        return self.__repr__() == other.__repr__()
+        if self.__class__.__name__ != other.__class__.__name__:
+            return NotImplemented
+
+        return (
+            self.markdown == other.markdown
+            and self.text_type == other.text_type
+            and self.url == other.url
+        )
 
     def __repr__(self):
         args = f"{self.markdown!r}, {self.text_type!r}, {self.url!r}"
@@ -145,6 +171,39 @@ def split_nodes_image(old_nodes):
 
 
 def markdown_to_text_nodes(markdown):
+    nodes = []
+    styles = []  # open emphasis delimiters, innermost last
+    pos = 0
+    for m in INLINE_TOKENS.finditer(markdown):
+        if m.start() > pos:
+            text_type = DELIMITERS[styles[-1]] if styles else TT.TEXT
+            nodes.append(TextNode(markdown[pos : m.start()], text_type))
+
+        pos = m.end()
+        kind = m.lastgroup
+        if kind == "code":
+            nodes.append(TextNode(m["code"], TT.CODE))
+        elif kind == "src":
+            nodes.append(TextNode(m["alt"], TT.IMAGE, m["src"]))
+        elif kind == "href":
+            nodes.append(TextNode(m["text"], TT.LINK, m["href"]))
+        elif m["delim"] == "`":
+            raise ValueError(f"Delimiter '`' not closed in {markdown!r}")
+        elif styles and styles[-1] == m["delim"]:
+            styles.pop()
+        else:
+            styles.append(m["delim"])
+
+    if styles:
+        raise ValueError(f"Delimiter {styles[-1]!r} not closed in {markdown!r}")
+
+    if pos < len(markdown):
+        nodes.append(TextNode(markdown[pos:], TT.TEXT))
+
+    return [n for n in nodes if n.markdown]
+
+
+def markdown_to_text_nodes_reference(markdown):
     nodes = [TextNode(markdown, TT.TEXT)]
     nodes = split_nodes_delimiter(nodes, "**", TT.BOLD)
     nodes = split_nodes_delimiter(nodes, "*", TT.ITALIC)
@@ -176,29 +235,237 @@ def block_to_block_type(block):
         return BT.PARAGRAPH
 
 
-def markdown_to_html_node(markdown):
+def scan_blocks(markdown):
+    # One pass over the lines, working on offsets into `markdown`. Blocks end
+    # at blank lines, except inside ``` fences, which run to the closing fence.
+    # The result matches markdown_to_blocks + block_to_block_type, apart from
+    # fenced code keeping its blank lines and whitespace-only lines
+    # separating blocks.
+    blocks = []
+    n = len(markdown)
+    pos = 0
+    start = end = -1  # offsets of the current block, -1 when there is none
+    content = -1  # offset of the block's first non-blank character
+    # dedent is only needed when no line starts at column 0, or to empty
+    # whitespace-only lines inside a fence
+    flush_left = ws_lines = fenced = False
+    # a fence still open at the end of the document has no closing line after
+    # it, so nothing past this offset can open one
+    fence_limit = n
+
+    while pos <= n:
+        if fenced and flush_left:
+            # nothing can close the fence before the next ```, so skip the
+            # lines in between at C speed, noting any whitespace-only ones
+            fence = markdown.find("```", pos)
+            skip_to = markdown.rfind("\n", pos, n if fence == -1 else fence) + 1
+            if skip_to > pos:
+                end = skip_to - 1
+                ws_line = WHITESPACE_LINE.search(markdown, pos - 1, skip_to)
+                ws_lines = ws_lines or ws_line is not None
+                pos = skip_to
+
+        nl = markdown.find("\n", pos)
+        if nl == -1:
+            nl = n
+
+        if pos < nl and markdown[pos] not in WHITESPACE:
+            first = pos
+        else:
+            m = LINE_CONTENT.search(markdown, pos, nl)
+            first = m.start() if m else -1
+
+        if start == -1:
+            if first != -1:
+                start, end, content = pos, nl, first
+                flush_left, ws_lines = first == pos, False
+                fenced = pos < fence_limit and markdown.startswith("```", first)
+                if fenced and _closes_fence(markdown, first + 3, nl):
+                    block = _typed_block(markdown, start, end, content, not flush_left)
+                    blocks.append(block)
+                    start, fenced = -1, False
+        elif fenced:
+            end = nl
+            flush_left = flush_left or first == pos
+            ws_lines = ws_lines or (first == -1 and nl > pos)
+            if first != -1 and _closes_fence(markdown, first, nl):
+                dedent = ws_lines or not flush_left
+                blocks.append(_typed_block(markdown, start, end, content, dedent))
+                start, fenced = -1, False
+        elif first == -1:
+            blocks.append(_typed_block(markdown, start, end, content, not flush_left))
+            start = -1
+        else:
+            end = nl
+            flush_left = flush_left or first == pos
+
+        if fenced and nl == n:
+            # unclosed fence: read the same lines again as ordinary blocks
+            pos, fence_limit = start, start
+            start, fenced = -1, False
+            continue
+
+        pos = nl + 1
+
+    if start != -1:
+        blocks.append(_typed_block(markdown, start, end, content, not flush_left))
+
+    return blocks
+
+
+def _closes_fence(markdown, start, end):
+    if markdown.find("```", start, end) == -1:
+        return False
+    return markdown[start:end].rstrip().endswith("```")
+
+
+def _typed_block(markdown, start, end, content, dedent):
+    block = markdown[start:end]
+    block = textwrap.dedent(block).strip() if dedent else block.strip()
+
+    if markdown.startswith("#", content):
+        return BT.HEADING, block
+    elif block.startswith("```") and block.endswith("```"):
+        return BT.CODE, block
+    elif markdown.startswith(">", content):
+        return BT.QUOTE, block
+    elif markdown.startswith(("- ", "* "), content):
+        return BT.UNORDERED_LIST, block
+    elif ORDERED_LIST_START.match(markdown, content):
+        return BT.ORDERED_LIST, block
+    else:
+        return BT.PARAGRAPH, block
+
+
+def markdown_to_html_node(markdown, timer=None, cache=None, assets=None):
+    return _render(markdown, timer, cache, assets, None)
+
+
+def parse_markdown(markdown, timer=None, cache=None, assets=None):
+    # like markdown_to_html_node, plus a PageInfo collected from the same
+    # nodes; headings get ids matching the anchors in its outline
+    info = PageInfo()
+    return _render(markdown, timer, cache, assets, info), info
+
+
+def _render(markdown, timer, cache, assets, info):
+    start = time.perf_counter()
+    blocks = scan_blocks(markdown)
+    if timer:
+        timer.add("scan_blocks", time.perf_counter() - start)
+
     block_nodes = []
-    for b in markdown_to_blocks(markdown):
-        b_type = block_to_block_type(b)
-
-        try:
-            # fmt: off
-            if   b_type == BT.PARAGRAPH:      node = block_to_html_p(b)
-            elif b_type == BT.HEADING:        node = block_to_html_heading(b)
-            elif b_type == BT.CODE:           node = block_to_html_pre(b)
-            elif b_type == BT.QUOTE:          node = block_to_html_blockquote(b)
-            elif b_type == BT.UNORDERED_LIST: node = block_to_html_ul(b)
-            elif b_type == BT.ORDERED_LIST:   node = block_to_html_ol(b)
-            # fmt: on
-        except:
-            print(f"Error processing block: {b!r}")
-            raise
-
-        block_nodes.append(node)
+    for b_type, b in blocks:
+        start = time.perf_counter()
+        block_nodes.append(render_block(b, b_type, cache, assets, info))
+        if timer:
+            timer.add(f"block:{b_type.value}", time.perf_counter() - start)
 
     return ParentNode("div", block_nodes)
 
 
+def iter_markdown_blocks(lines):
+    # group lines into chunks that end at blank lines outside of fences, which
+    # are the only places scan_blocks() could end a block too, so each chunk
+    # can be scanned on its own and memory stays bounded by the largest block
+    chunk = []
+    fenced = False
+    block_start = True
+    for line in lines:
+        stripped = line.strip(WHITESPACE + "\n")
+        if not fenced and not stripped:
+            if chunk:
+                yield from scan_blocks("".join(chunk))
+                chunk = []
+            block_start = True
+            continue
+
+        chunk.append(line)
+        if fenced:
+            fenced = not line.rstrip().endswith("```")
+            block_start = not fenced
+        elif block_start and stripped.startswith("```"):
+            # a fence closed on its own line is a whole block already
+            fenced = not stripped[3:].rstrip().endswith("```")
+            block_start = not fenced
+        else:
+            block_start = False
+
+    if chunk:
+        # an unclosed fence ends up here with the rest of the file, which
+        # scan_blocks() turns back into plain text
+        yield from scan_blocks("".join(chunk))
+
+
+def iter_html_blocks(lines, cache=None, assets=None, info=None):
+    for b_type, b in iter_markdown_blocks(lines):
+        yield render_block(b, b_type, cache, assets, info)
+
+
+def render_block(block, b_type, cache=None, assets=None, info=None):
+    # urls and image sizes are rewritten before caching, so entries carry the
+    # asset map's signature for the links and images in them
+    try:
+        if b_type == BT.HEADING:
+            # never cached: they're rarely shared, and their anchors depend
+            # on the headings before them
+            node, data = _block_node(block, b_type, assets, info is not None)
+            if info is not None:
+                info.add_block(data)
+                anchor = info.add_heading(int(node.tag[1]), node_text(node))
+                node.props = {"id": anchor}
+            return node
+
+        if cache is None:
+            node, data = _block_node(block, b_type, assets, info is not None)
+            if info is not None:
+                info.add_block(data)
+            return node
+
+        entry = cache.get(b_type, block, lambda data: _valid(data, assets))
+        if entry is None:
+            node, data = _block_node(block, b_type, assets, True)
+            data["assets"] = asset_signature(data, assets)
+            entry = (node.to_html(), data)
+            cache.put(b_type, block, *entry)
+
+        if info is not None:
+            info.add_block(entry[1])
+        return LeafNode(None, entry[0])
+    except:
+        print(f"Error processing block: {block!r}")
+        raise
+
+
+def asset_signature(info, assets):
+    # info is a block's or a page's info dict
+    return assets.signature(info["links"], info["images"]) if assets else ""
+
+
+def _valid(data, assets):
+    return data is not None and data.get("assets") == asset_signature(data, assets)
+
+
+def _block_node(block, b_type, assets=None, with_info=False):
+    node = block_to_html_node(block, b_type)
+    # taken before urls are rewritten, so it has the links as they were written
+    data = block_info(node) if with_info else None
+    if assets:
+        assets.rewrite_node(node)
+    return node, data
+
+
+def block_to_html_node(block, b_type):
+    # fmt: off
+    if   b_type == BT.PARAGRAPH:      return block_to_html_p(block)
+    elif b_type == BT.HEADING:        return block_to_html_heading(block)
+    elif b_type == BT.CODE:           return block_to_html_pre(block)
+    elif b_type == BT.QUOTE:          return block_to_html_blockquote(block)
+    elif b_type == BT.UNORDERED_LIST: return block_to_html_ul(block)
+    elif b_type == BT.ORDERED_LIST:   return block_to_html_ol(block)
+    # fmt: on
+
+
 def block_to_html_p(block):
     nodes = markdown_to_text_nodes(block)
     nodes = [n.to_html_node() for n in nodes]
@@ -229,7 +496,8 @@ def block_to_html_blockquote(block):
 def block_to_html_ul(block):
     ul_children = []
     for item in block.split("\n"):
-        item = re.sub(r"^[-*] ", "", item)
+        if item.startswith(("- ", "* ")):
+            item = item[2:]
         item_children = markdown_to_text_nodes(item)
         item_children = [c.to_html_node() for c in item_children]
         ul_children.append(ParentNode("li", item_children))
@@ -240,10 +508,11 @@ def block_to_html_ul(block):
 def block_to_html_ol(block):
     ul_children = []
     for item in block.split("\n"):
-        item = re.sub(r"^\d+\. ", "", item)
+        number, sep, rest = item.partition(". ")
+        if sep and number.isdecimal():
+            item = rest
         item_children = markdown_to_text_nodes(item)
         item_children = [c.to_html_node() for c in item_children]
         ul_children.append(ParentNode("li", item_children))
 
     return ParentNode("ol", ul_children)
-
@@ -0,0 +1,157 @@
+import hashlib
+import marshal
+import os
+import sys
+
+from pathlib import Path
+
+from html_node import NO_CHILDREN, NO_PROPS, LeafNode, ParentNode
+from page_info import PageInfo
+from text_node import asset_signature
+
+
+# a tree is only as good as the code that parsed it
+PARSER_MODULES = (
+    "text_node.py",
+    "html_node.py",
+    "page_info.py",
+    "assets.py",
+    "tree_cache.py",
+)
+
+# fields per node in the flat encoding, see encode_tree()
+FIELDS = 5
+
+_new = object.__new__
+
+
+def parser_version():
+    # entries are only read back by the same marshal format too
+    h = hashlib.sha256(f"{marshal.version}-{sys.version_info[:2]}".encode())
+    src = Path(__file__).parent
+    for name in PARSER_MODULES:
+        h.update(src.joinpath(name).read_bytes())
+    return h.hexdigest()
+
+
+class TreeCache:
+    # the parsed tree and PageInfo of every page, on disk, keyed by the
+    # markdown they were parsed from: a page whose template changed is
+    # rendered again without being parsed again
+    VERSION = 1
+
+    def __init__(self, path, max_bytes=256 << 20, namespace="", refresh=False):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        # every page parsed again, with entries written but never read
+        self.refresh = refresh
+        # whatever else the trees depend on, like the asset map urls are
+        # rewritten with
+        self.namespace = namespace
+        self.version = f"{self.VERSION}-{parser_version()}"
+
+    def options(self):
+        return {
+            "path": self.path,
+            "max_bytes": self.max_bytes,
+            "namespace": self.namespace,
+            "refresh": self.refresh,
+        }
+
+    def entry_path(self, markdown):
+        h = hashlib.blake2b(digest_size=16)
+        h.update(f"{self.version}\0{self.namespace}\0".encode())
+        h.update(markdown.encode())
+        key = h.hexdigest()
+        return self.path.joinpath(key[:2], key[2:])
+
+    def get(self, markdown, assets=None):
+        # (node, info) as parse_markdown() returned them, or None; a tree is
+        # only reused while its links and images are rewritten the same way
+        if self.refresh:
+            return None
+
+        path = self.entry_path(markdown)
+        try:
+            data = path.read_bytes()
+        except FileNotFoundError:
+            return None
+
+        try:
+            flat, info = marshal.loads(data)
+            if info["assets"] != asset_signature(info, assets):
+                return None
+            tree = decode_tree(flat), PageInfo.from_dict(info)
+        except (ValueError, EOFError, TypeError, KeyError, IndexError):
+            # a corrupt entry is parsed again and overwritten by put()
+            return None
+
+        # an entry's mtime is when it was last used, for prune()
+        os.utime(path)
+        return tree
+
+    def put(self, markdown, node, info, assets=None):
+        data = {**info.to_dict(), "terms": info.terms}
+        data["assets"] = asset_signature(data, assets)
+        path = self.entry_path(markdown)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # workers write entries concurrently, so never leave one half written
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        tmp.write_bytes(marshal.dumps((encode_tree(node), data)))
+        tmp.replace(path)
+
+    def prune(self):
+        # drop the least recently used entries until the cache fits
+        entries = []
+        for dirpath, _, filenames in os.walk(self.path):
+            for name in filenames:
+                st = os.stat(os.path.join(dirpath, name))
+                entries.append((st.st_mtime_ns, st.st_size, dirpath, name))
+
+        size = sum(e[1] for e in entries)
+        evicted = 0
+        for _, n, dirpath, name in sorted(entries):
+            if size <= self.max_bytes:
+                break
+            os.unlink(os.path.join(dirpath, name))
+            size -= n
+            evicted += 1
+
+        print(
+            f"[INFO] Tree cache: {len(entries) - evicted} entries, "
+            f"{size / 1e6:.1f} MB, {evicted} evicted"
+        )
+
+
+def encode_tree(node):
+    # the nodes in document order as one flat list of (tag, value, props,
+    # number of children, self_closing), which marshal writes and reads
+    # much faster than nested objects
+    flat = []
+    stack = [node]
+    while stack:
+        n = stack.pop()
+        props = dict(n.props) or None
+        flat += (n.tag, n.value, props, len(n.children), n.self_closing)
+        stack.extend(reversed(n.children))
+    return flat
+
+
+def decode_tree(flat):
+    # walk the nodes backwards, so a node's children are all built by the
+    # time it is; nodes are filled in directly, they were checked when parsed
+    stack = []
+    for i in range(len(flat) - FIELDS, -1, -FIELDS):
+        tag, value, props, n, self_closing = flat[i : i + FIELDS]
+        if value is None:
+            node = _new(ParentNode)
+            node.children = [stack.pop() for _ in range(n)]
+        else:
+            node = _new(LeafNode)
+            node.children = NO_CHILDREN
+        node.tag = tag
+        node.value = value
+        node.props = props or NO_PROPS
+        node.self_closing = self_closing
+        stack.append(node)
+    return stack[0]
@@ -0,0 +1,60 @@
+import os
+import time
+
+
+def snapshot(paths):
+    files = {}
+    stack = [os.fspath(p) for p in paths]
+    while stack:
+        path = stack.pop()
+        try:
+            entries = list(os.scandir(path))
+        except NotADirectoryError:
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            files[path] = (st.st_mtime_ns, st.st_size)
+            continue
+        except FileNotFoundError:
+            continue
+
+        for entry in entries:
+            if entry.is_dir():
+                stack.append(entry.path)
+            elif entry.is_file():
+                try:
+                    st = entry.stat()
+                except FileNotFoundError:
+                    # gone since it was listed, like the temp file an editor
+                    # saves to before renaming it over the original
+                    continue
+                files[entry.path] = (st.st_mtime_ns, st.st_size)
+
+    return files
+
+
+def changed_files(old, new):
+    return sorted(p for p in old.keys() | new.keys() if old.get(p) != new.get(p))
+
+
+def watch(paths, on_change, interval=0.25, debounce=0.1):
+    state = snapshot(paths)
+    while True:
+        time.sleep(interval)
+        current = snapshot(paths)
+        if current == state:
+            continue
+
+        # editors often save in bursts (temp file, rename, chmod), so wait
+        # until the tree stops changing before reporting anything
+        while True:
+            time.sleep(debounce)
+            settled = snapshot(paths)
+            if settled == current:
+                break
+            current = settled
+
+        changed = changed_files(state, current)
+        state = current
+        on_change(changed)
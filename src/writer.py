@@ -0,0 +1,84 @@
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+
+class Writer:
+    # writes rendered pages on a few threads, so rendering the next page
+    # doesn't wait on the disk; at most max_pending pages are held in memory,
+    # past that write() blocks until one of them is on disk
+    def __init__(self, threads=4, max_pending=64):
+        self.pool = ThreadPoolExecutor(threads, thread_name_prefix="writer")
+        self.slots = threading.BoundedSemaphore(max_pending)
+        self.lock = threading.Lock()
+        self.dirs = set()
+        self.errors = []
+        self.written = self.unchanged = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            # the build already failed, don't hide why behind a write error
+            self.pool.shutdown()
+
+    def write(self, path, data):
+        self.slots.acquire()
+        try:
+            future = self.pool.submit(self._write, Path(path), data)
+        except BaseException:
+            self.slots.release()
+            raise
+        future.add_done_callback(self._done)
+        return future
+
+    def _write(self, path, data):
+        parent = path.parent
+        if parent not in self.dirs:
+            parent.mkdir(parents=True, exist_ok=True)
+            with self.lock:
+                self.dirs.add(parent)
+
+        changed = write_file(path, data)
+        with self.lock:
+            if changed:
+                self.written += 1
+            else:
+                self.unchanged += 1
+
+    def _done(self, future):
+        self.slots.release()
+        if future.exception() is not None:
+            with self.lock:
+                self.errors.append(future.exception())
+
+    def close(self):
+        self.pool.shutdown()
+        if self.errors:
+            raise self.errors[0]
+        print(f"[INFO] Wrote {self.written} page(s), {self.unchanged} unchanged")
+
+
+def write_file(path, data):
+    # replace path with data in one rename, so a server never sends a half
+    # written page; returns False, and leaves the file and its mtime alone,
+    # when it already has exactly these bytes
+    path = Path(path)
+    try:
+        if path.stat().st_size == len(data) and path.read_bytes() == data:
+            return False
+    except FileNotFoundError:
+        pass
+
+    tmp = path.with_name(f".{path.name}.{threading.get_ident()}.tmp")
+    try:
+        tmp.write_bytes(data)
+        tmp.replace(path)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+    return True
@@ -0,0 +1,95 @@
+import json
+import os
+
+from assets import AssetMap, sync_dir
+from manifest import Manifest
+from text_node import markdown_to_html_node
+
+
+def test_sync_dir(tmp_path, capsys):
+    static = tmp_path / "static"
+    (static / "images").mkdir(parents=True)
+    (static / "index.css").write_text("body {}")
+    (static / "images" / "a.png").write_bytes(b"png")
+
+    public = tmp_path / "public"
+    m = Manifest(tmp_path / "manifest.json", "gen")
+    sync_dir(static, public, m)
+    m.save()
+    assert (public / "images" / "a.png").read_bytes() == b"png"
+    assert "2 copied, 0 unchanged, 0 deleted" in capsys.readouterr().out
+
+    # unchanged files are skipped, removed ones are pruned
+    (static / "images" / "a.png").unlink()
+    (static / "index.css").write_text("body { color: red }")
+    m = Manifest(tmp_path / "manifest.json", "gen")
+    sync_dir(static, public, m)
+    assert (public / "index.css").read_text() == "body { color: red }"
+    assert not (public / "images" / "a.png").exists()
+    assert "1 copied, 0 unchanged, 1 deleted" in capsys.readouterr().out
+
+    # a touched file with the same bytes is only copied without --checksum
+    os.utime(static / "index.css", ns=(0, 0))
+    sync_dir(static, public, checksum=True)
+    assert "0 copied, 1 unchanged" in capsys.readouterr().out
+    assert (public / "index.css").stat().st_mtime_ns == 0
+
+    (static / "new.txt").write_text("x")
+    sync_dir(static, public, link=True)
+    assert (public / "new.txt").samefile(static / "new.txt")
+
+
+def test_sync_dir_fingerprint(tmp_path):
+    static = tmp_path / "static"
+    static.mkdir()
+    (static / "index.css").write_text("body {}")
+    (static / "robots.txt").write_text("")
+
+    public = tmp_path / "public"
+    urls = sync_dir(static, public, fingerprint=True)
+    hashed = urls["/index.css"]
+    assert hashed.startswith("/index.") and hashed.endswith(".css")
+    assert (public / hashed[1:]).read_text() == "body {}"
+    assert (public / "index.css").exists()
+    assert "/robots.txt" not in urls
+    assert json.loads((public / "assets.json").read_text()) == urls
+
+    (static / "index.css").write_text("body { color: red }")
+    assert sync_dir(static, public, fingerprint=True)["/index.css"] != hashed
+
+
+def test_asset_map():
+    assets = AssetMap({"/index.css": "/index.abc.css", "/my img.png": "/my img.1.png"})
+    assert assets.url("/index.css?v=2#top") == "/index.abc.css?v=2#top"
+    assert assets.url("/my%20img.png") == "/my%20img.1.png"
+    assert assets.url("index.css") == "index.css"
+    assert assets.url("//cdn.example.com/index.css") == "//cdn.example.com/index.css"
+
+    html = '<link href="/index.css"><a href="/other.css">{{ title }}</a>'
+    assert assets.references(html) == ["/index.css", "/other.css"]
+    assert assets.rewrite_html(html) == (
+        '<link href="/index.abc.css"><a href="/other.css">{{ title }}</a>'
+    )
+
+    node = markdown_to_html_node("[css](/index.css) ![img](/my%20img.png)")
+    assets.rewrite_node(node)
+    assert node.to_html() == (
+        '<div><p><a href="/index.abc.css">css</a> '
+        '<img src="/my%20img.1.png" alt="img" loading="lazy" decoding="async" />'
+        "</p></div>"
+    )
+
+    assets = AssetMap(sizes={"/a.png": (640, 480)})
+    node = markdown_to_html_node("![a](/a.png?v=1)")
+    assets.rewrite_node(node)
+    assert node.to_html() == (
+        '<div><p><img src="/a.png?v=1" alt="a" width="640" height="480" '
+        'loading="lazy" decoding="async" /></p></div>'
+    )
+    # sizes aren't in the fingerprint, only in the signatures of the pages
+    # and blocks with that image
+    assert AssetMap({}).fingerprint == assets.fingerprint
+    images = [{"src": "/a.png?v=1", "alt": "a"}]
+    assert assets.signature([], images) != AssetMap().signature([], images)
+    assert assets.signature(["/b.css"], []) == AssetMap().signature(["/b.css"], [])
+    assert assets.signature([], []) == ""
@@ -0,0 +1,22 @@
+import pytest
+
+from benchmark import STAGES, benchmark, compare, make_corpus, parse_mix
+
+
+def test_parse_mix():
+    assert parse_mix("links=3,code") == {"links": 3.0, "code": 1.0}
+    with pytest.raises(ValueError):
+        parse_mix("tables")
+
+
+def test_benchmark(tmp_path, capsys):
+    make_corpus(tmp_path / "content", 12, parse_mix("prose,links,lists"), 3, depth=3)
+    assert len(list((tmp_path / "content").rglob("*.md"))) == 12
+
+    results = benchmark(tmp_path / "content", tmp_path / "public", repeat=1)
+    assert results["pages"] == 12
+    assert list(results["stages"]) == STAGES
+    assert results["peak_memory"] > 0
+
+    slower = {**results, "stages": {s: 0.0 for s in STAGES}, "total": 1e-9}
+    assert compare(results, slower, 0.1) == ["total"]
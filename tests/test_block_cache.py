@@ -0,0 +1,61 @@
+from assets import AssetMap
+from block_cache import BlockCache
+from text_node import BT, markdown_to_html_node
+
+
+def test_block_cache_eviction():
+    cache = BlockCache(max_entries=2)
+    cache.put(BT.PARAGRAPH, "a", "<p>a</p>")
+    cache.put(BT.PARAGRAPH, "b", "<p>b</p>")
+    assert cache.get(BT.PARAGRAPH, "a") == ("<p>a</p>", None)
+
+    cache.put(BT.PARAGRAPH, "c", "<p>c</p>")
+    assert cache.get(BT.PARAGRAPH, "b") is None
+    assert cache.get(BT.UNORDERED_LIST, "a") is None
+    assert (cache.hits, cache.misses, cache.evictions) == (1, 2, 1)
+
+    cache = BlockCache(max_bytes=10)
+    cache.put(BT.PARAGRAPH, "a", "<p>a</p>")
+    cache.put(BT.PARAGRAPH, "b", "<p>b</p>")
+    assert list(cache.entries.values()) == [("<p>b</p>", None)]
+
+
+def test_block_cache_persistence(tmp_path):
+    path = tmp_path / "blocks.json"
+    cache = BlockCache(path=path, namespace="gen-1")
+    cache.put(BT.PARAGRAPH, "a", "<p>a</p>", {"words": 1})
+    cache.save()
+
+    entry = BlockCache(path=path, namespace="gen-1").get(BT.PARAGRAPH, "a")
+    assert entry == ("<p>a</p>", {"words": 1})
+    assert not BlockCache(path=path, namespace="gen-2").get(BT.PARAGRAPH, "a")
+
+    other = BlockCache(path=path, namespace="gen-1")
+    other.put(BT.PARAGRAPH, "b", "<p>b</p>")
+    other.get(BT.PARAGRAPH, "b")
+    cache.merge(other.drain())
+    assert cache.get(BT.PARAGRAPH, "b") == ("<p>b</p>", None)
+    assert (cache.hits, cache.misses) == (2, 0)
+    assert other.added == {}
+
+
+def test_markdown_to_html_node_cache():
+    markdown = "# title\n\nshared *note*\n\n- a\n- b\n\nshared *note*"
+    cache = BlockCache()
+    html = markdown_to_html_node(markdown, cache=cache).to_html()
+    assert html == markdown_to_html_node(markdown).to_html()
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_markdown_to_html_node_cache_assets():
+    markdown = "![a](/a.png)\n\n![b](/b.png)"
+    cache = BlockCache()
+    small = AssetMap(sizes={"/a.png": (1, 1), "/b.png": (1, 1)})
+    markdown_to_html_node(markdown, cache=cache, assets=small)
+
+    # only the block whose image changed size is rendered again
+    resized = AssetMap(sizes={"/a.png": (2, 2), "/b.png": (1, 1)})
+    html = markdown_to_html_node(markdown, cache=cache, assets=resized).to_html()
+    assert html == markdown_to_html_node(markdown, assets=resized).to_html()
+    assert 'width="2"' in html
+    assert (cache.hits, cache.misses) == (1, 3)
@@ -0,0 +1,42 @@
+import gzip
+
+from compress import compress_dir, prune_compressed
+
+
+def test_compress_dir(tmp_path, capsys):
+    page = tmp_path / "blog" / "index.html"
+    page.parent.mkdir()
+    page.write_text("<p>hello</p>" * 100)
+    (tmp_path / "tiny.css").write_text("a {}")
+    (tmp_path / "image.png").write_bytes(b"\x89PNG" * 100)
+    (tmp_path / "archive.tar.gz").write_bytes(b"keep me")
+
+    compress_dir(tmp_path, jobs=2)
+    gz = tmp_path / "blog" / "index.html.gz"
+    assert gzip.decompress(gz.read_bytes()) == page.read_bytes()
+    assert not (tmp_path / "tiny.css.gz").exists()
+    assert not (tmp_path / "image.png.gz").exists()
+    assert "Compressed 1 file(s)" in capsys.readouterr().out
+
+    compress_dir(tmp_path)
+    assert "Compressed 0 file(s)" in capsys.readouterr().out
+
+    page.unlink()
+    compress_dir(tmp_path)
+    assert not gz.exists()
+    assert (tmp_path / "archive.tar.gz").exists()
+
+
+def test_prune_compressed(tmp_path):
+    page = tmp_path / "index.html"
+    page.write_text("<p>hello</p>" * 100)
+    css = tmp_path / "index.0123456789.css"
+    css.write_text("p { color: red }" * 100)
+    compress_dir(tmp_path)
+    assert prune_compressed(tmp_path) == 0
+
+    # rebuilt without --gzip, and a fingerprinted copy that went away
+    page.write_text("<p>bye</p>" * 100)
+    css.unlink()
+    assert prune_compressed(tmp_path) == 2
+    assert [p.name for p in tmp_path.iterdir()] == ["index.html"]
@@ -1,3 +1,5 @@
+import io
+
 import pytest
 
 
@@ -60,3 +62,32 @@ def test_ParentNode():
     body = '<body><div class="flex"><p>Hello, World!</p></div></body>'
     assert n.to_html() == f"<html>{head}{body}</html>"
 
+
+def test_write_html():
+    n = ParentNode(
+        "ul",
+        [
+            ParentNode("li", [LeafNode("b", "one"), LeafNode(None, " item")]),
+            ParentNode("li", [LeafNode("img", "", {"src": "x.png"}, True)]),
+        ],
+    )
+    expected = '<ul><li><b>one</b> item</li><li><img src="x.png" /></li></ul>'
+    assert "".join(n.iter_html()) == expected
+
+    fp = io.StringIO()
+    n.write_html(fp)
+    assert fp.getvalue() == expected
+
+
+def test_equality():
+    assert LeafNode("b", "x") == LeafNode("b", "x")
+    assert LeafNode("b", "x") != LeafNode("i", "x")
+    assert LeafNode("a", "x", {"href": "/"}) != LeafNode("a", "x", {"href": "/a"})
+    assert ParentNode("p", [LeafNode("b", "x")]) == ParentNode(
+        "p", (LeafNode("b", "x"),)
+    )
+    assert ParentNode("p", [LeafNode("b", "x")]) != LeafNode("p", "x")
+
+    n = LeafNode(None, "x")
+    assert not hasattr(n, "__dict__")
+    assert n.props == {}
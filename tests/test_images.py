@@ -0,0 +1,73 @@
+import json
+import struct
+
+import pytest
+
+from images import image_size, scan_images
+
+
+def png(w, h):
+    return b"\x89PNG\r\n\x1a\n" + struct.pack(">I4sII", 13, b"IHDR", w, h) + b"\0" * 9
+
+
+def jpeg(w, h, orientation=None):
+    data = b"\xff\xd8"
+    if orientation:
+        # little endian TIFF header, one IFD entry: orientation (0x0112)
+        tiff = b"II*\0" + struct.pack("<IHHHIHH", 8, 1, 0x0112, 3, 1, orientation, 0)
+        app1 = b"Exif\0\0" + tiff
+        data += b"\xff\xe1" + struct.pack(">H", len(app1) + 2) + app1
+    data += b"\xff\xdb\x00\x04\x00\x00"  # a quantization table to skip
+    sof = struct.pack(">BHHB", 8, h, w, 3) + b"\0" * 9
+    return data + b"\xff\xc0" + struct.pack(">H", len(sof) + 2) + sof + b"\xff\xd9"
+
+
+def webp(chunk, payload):
+    return b"RIFF" + struct.pack("<I", 100) + b"WEBP" + chunk + b"\0" * 4 + payload
+
+
+@pytest.mark.parametrize(
+    "data, size",
+    [
+        (png(1344, 896), (1344, 896)),
+        (b"GIF89a" + struct.pack("<HH", 320, 200) + b"\0" * 8, (320, 200)),
+        (jpeg(800, 600), (800, 600)),
+        # rotated by 90 degrees, as browsers show it
+        (jpeg(800, 600, orientation=6), (600, 800)),
+        (webp(b"VP8 ", b"\0\0\0\x9d\x01\x2a" + struct.pack("<HH", 64, 48)), (64, 48)),
+        (webp(b"VP8L", b"\x2f" + (63 | 47 << 14).to_bytes(4, "little")), (64, 48)),
+        (
+            webp(
+                b"VP8X",
+                b"\0" * 4 + (63).to_bytes(3, "little") + (47).to_bytes(3, "little"),
+            ),
+            (64, 48),
+        ),
+        (b"not an image", None),
+        (b"\x89PNG\r\n\x1a\n", None),
+        (b"\xff\xd8\xff\xe0", None),
+        (webp(b"VP8L", b""), None),
+        (webp(b"VP8X", b"\0" * 4), None),
+    ],
+)
+def test_image_size(tmp_path, data, size):
+    path = tmp_path / "image"
+    path.write_bytes(data)
+    assert image_size(path) == size
+
+
+def test_scan_images(tmp_path):
+    static = tmp_path / "static"
+    (static / "images").mkdir(parents=True)
+    (static / "images" / "a.png").write_bytes(png(10, 20))
+    (static / "images" / "broken.gif").write_bytes(b"GIF")
+    (static / "index.css").write_text("body {}")
+
+    cache = tmp_path / "images.json"
+    assert scan_images(static, cache_path=cache) == {"/images/a.png": (10, 20)}
+    assert len(json.loads(cache.read_text())) == 2
+
+    # sizes come from the cache while the file's hash doesn't change
+    known = {h: s and [1, 2] for h, s in json.loads(cache.read_text()).items()}
+    cache.write_text(json.dumps(known))
+    assert scan_images(static, cache_path=cache) == {"/images/a.png": (1, 2)}
@@ -0,0 +1,64 @@
+from links import RouteIndex, check_links
+
+
+def make_routes():
+    routes = RouteIndex()
+    routes.add_page("/", ["home"])
+    routes.add_page("/blog/", ["posts"])
+    routes.add_page("/blog/first.html", ["intro", "intro-1"])
+    routes.add_file("/images/a.png")
+    return routes
+
+
+def test_route_index_check():
+    routes = make_routes()
+    ok = [
+        "/",
+        "/index.html",
+        "/blog",
+        "/blog/",
+        "/blog/index.html#posts",
+        "/blog/first.html#intro-1",
+        "/images/a.png?v=1",
+        "/images/a.png#anything",
+        "first.html",
+        "../images/a.png",
+        "./",
+        "#intro",
+        "https://example.com/missing",
+        "//cdn.example.com/x.js",
+        "mailto:someone@example.com",
+    ]
+    for href in ok:
+        assert routes.check("/blog/first.html", href) is None, href
+
+    assert routes.check("/blog/first.html", "/missing.html") == "no such page or file"
+    assert routes.check("/blog/first.html", "second.html") == "no such page or file"
+    assert routes.check("/blog/first.html", "#outro") == "no heading #outro"
+    assert routes.check("/", "/blog/#intro") == "no heading #intro"
+    assert routes.check("/", "blog/first.html") is None
+
+
+def test_check_links(tmp_path, capsys):
+    src = tmp_path / "first.md"
+    src.write_text(
+        "# Intro\n\n[home](/) and [gone](/gone.html)\n\n![a](/img.png) [gone](/gone.html)\n"
+    )
+    info = {
+        "links": ["/", "/gone.html", "/gone.html"],
+        "images": [{"src": "/img.png", "alt": "a"}],
+    }
+    pages = [(src, "/blog/first.html", info)]
+
+    broken = check_links(pages, make_routes())
+    assert broken == [
+        (str(src), 3, "link", "/gone.html", "no such page or file"),
+        (str(src), 5, "link", "/gone.html", "no such page or file"),
+        (str(src), 5, "image", "/img.png", "no such page or file"),
+    ]
+    out = capsys.readouterr().out
+    assert f"[ERROR] {src}:3: broken link '/gone.html'" in out
+    assert "Checked 4 link(s) on 1 page(s)" in out
+    assert "3 broken" in out
+
+    assert check_links(pages, make_routes(), jobs=2) == broken
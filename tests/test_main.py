@@ -1,7 +1,17 @@
+import json
+
 import pytest
 
+import main
+import writer
+
+from assets import AssetMap
+from manifest import Manifest
+from profiler import PageTimer
+from search import SearchIndex
+from tree_cache import TreeCache
 from text_node import markdown_to_html_node
-from main import extract_title
+from main import build_page, extract_title, generate_pages_recursive
 
 
 def test_extract_title():
@@ -31,3 +41,268 @@ def test_extract_title():
     with pytest.raises(ValueError):
         extract_title(html)
 
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_generate_pages_recursive(tmp_path, jobs):
+    content = tmp_path / "content"
+    (content / "blog").mkdir(parents=True)
+    (content / "index.md").write_text("# home")
+    (content / "blog" / "index.md").write_text("# blog\n\nsome *text*")
+
+    template = tmp_path / "template.html"
+    template.write_text("<title>{{ title }}</title>{{ content }}")
+
+    public = tmp_path / "public"
+    generate_pages_recursive(content, template, public, jobs=jobs)
+
+    html = (public / "blog" / "index.html").read_text()
+    assert (
+        html
+        == '<title>Blog</title><div><h1 id="blog">blog</h1><p>some <i>text</i></p></div>'
+    )
+    assert (public / "index.html").exists()
+
+    (content / "blog" / "index.md").write_text("no title")
+    (content / "index.md").write_text("# one\n\n# two")
+    with pytest.raises(ValueError, match="No title found"):
+        generate_pages_recursive(content, template, public, jobs=jobs)
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_generate_pages_recursive_failed_write(tmp_path, monkeypatch, jobs):
+    content = tmp_path / "content"
+    content.mkdir()
+    (content / "a.md").write_text("# a")
+    (content / "b.md").write_text("# b")
+    template = tmp_path / "template.html"
+    template.write_text("{{ content }}")
+    public = tmp_path / "public"
+    manifest = Manifest(tmp_path / "manifest.json", "gen")
+
+    write_file = writer.write_file
+
+    def fail_on_a(path, data):
+        if path.name == "a.html":
+            raise OSError("disk full")
+        return write_file(path, data)
+
+    monkeypatch.setattr(writer, "write_file", fail_on_a)
+    with pytest.raises(OSError, match="disk full"):
+        generate_pages_recursive(content, template, public, manifest, jobs)
+
+    # the page that wasn't written isn't recorded, so it's built again
+    assert str(public / "a.html") not in manifest.pages
+    assert str(public / "b.html") in manifest.pages
+
+
+def test_generate_page_front_matter(tmp_path):
+    (tmp_path / "template.html").write_text("{{ title }}|{{ content }}")
+    (tmp_path / "post.html").write_text("<{{ author }}> {{ title }}|{{ content }}")
+
+    src = tmp_path / "index.md"
+    src.write_text(
+        "---\ntitle: Custom\ntemplate: post.html\nauthor: me\n---\n# ignored"
+    )
+
+    generate_pages_recursive(tmp_path, tmp_path / "template.html", tmp_path / "out")
+    html = (tmp_path / "out" / "index.html").read_text()
+    assert html == '<me> Custom|<div><h1 id="ignored">ignored</h1></div>'
+
+
+def test_build_page_streamed(tmp_path, monkeypatch):
+    template = tmp_path / "template.html"
+    template.write_text("<title>{{ title }}</title>{{ content }}")
+    src = tmp_path / "page.md"
+    src.write_text("intro\n\n# big page\n\n```\ncode\n\nmore\n```\n\n- a\n- b\n")
+
+    build_page(src, template, tmp_path / "whole.html")
+    monkeypatch.setattr(main, "STREAM_THRESHOLD", 0)
+    build_page(src, template, tmp_path / "streamed.html")
+    expected = (tmp_path / "whole.html").read_text()
+    assert (tmp_path / "streamed.html").read_text() == expected
+
+    src.write_text("# one\n\ntext\n\n# two\n")
+    with pytest.raises(ValueError, match="Too many titles found"):
+        build_page(src, template, tmp_path / "streamed.html")
+    # the previous output is left alone
+    assert (tmp_path / "streamed.html").read_text() == expected
+    assert not list(tmp_path.glob(".*.tmp"))
+
+
+def test_generate_pages_recursive_dependencies(tmp_path, capsys):
+    content = tmp_path / "content"
+    content.mkdir()
+    (content / "a.md").write_text("# a")
+    (content / "b.md").write_text("---\ntemplate: post.html\n---\n# b")
+    (content / "template.html").write_text("{{> nav.html }}{{ content }}")
+    (content / "post.html").write_text("post {{ content }}")
+    (content / "nav.html").write_text("<nav>")
+
+    public = tmp_path / "public"
+    manifest = Manifest(tmp_path / "manifest.json", "gen")
+    generate_pages_recursive(content, content / "template.html", public, manifest)
+    manifest.save()
+    assert (public / "a.html").read_text() == '<nav><div><h1 id="a">a</h1></div>'
+
+    # only the page whose template includes the partial is rebuilt
+    (content / "nav.html").write_text("<nav/>")
+    manifest = Manifest(tmp_path / "manifest.json", "gen")
+    capsys.readouterr()
+    generate_pages_recursive(
+        content, content / "template.html", public, manifest, explain=True
+    )
+    out = capsys.readouterr().out
+    assert f"Rebuilding {str(public / 'a.html')!r}: " in out
+    assert f"{str(content / 'nav.html')!r} changed" in out
+    assert "1 page(s) to rebuild, 1 up to date" in out
+    assert (public / "a.html").read_text() == '<nav/><div><h1 id="a">a</h1></div>'
+
+
+def test_generate_pages_recursive_fingerprint(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    static = tmp_path / main.STATIC_DIR
+    static.mkdir()
+    (static / "a.png").write_bytes(b"a")
+    (static / "b.css").write_text("b {}")
+    content = tmp_path / "content"
+    content.mkdir()
+    (content / "a.md").write_text("# a\n\n![a](/a.png)")
+    (content / "b.md").write_text("# b\n\n[style](/b.css)")
+    (content / "c.md").write_text("# c")
+    template = tmp_path / "template.html"
+    template.write_text('<link href="/site.css">{{ content }}')
+    public = tmp_path / "public"
+
+    def build(explain=False):
+        urls = main.sync_dir(static, public, fingerprint=True)
+        manifest = Manifest(tmp_path / "manifest.json", "gen")
+        generate_pages_recursive(
+            content,
+            template,
+            public,
+            manifest,
+            assets=AssetMap(urls),
+            explain=explain,
+        )
+        manifest.save()
+        return capsys.readouterr().out
+
+    build()
+    # a changed image only rebuilds the page that shows it
+    (static / "a.png").write_bytes(b"aa")
+    out = build(explain=True)
+    assert "1 page(s) to rebuild, 2 up to date" in out
+    assert "'static/a.png' changed" in out
+
+    # every page links the template's stylesheet, once it exists
+    (static / "site.css").write_text("body {}")
+    out = build(explain=True)
+    assert "3 page(s) to rebuild, 0 up to date" in out
+    assert "'static/site.css' added" in out
+    href = AssetMap(main.sync_dir(static, public, fingerprint=True)).url("/site.css")
+    assert f'<link href="{href}">' in (public / "c.html").read_text()
+
+    (static / "b.css").write_text("b { color: red }")
+    assert "1 page(s) to rebuild, 2 up to date" in build(explain=True)
+
+
+def test_generate_pages_recursive_search(tmp_path):
+    content = tmp_path / "content"
+    content.mkdir()
+    (content / "index.md").write_text("# Home\n\nA page about *hobbits*.")
+    template = tmp_path / "template.html"
+    template.write_text("{{ content }}")
+
+    public = tmp_path / "public"
+    search = SearchIndex(tmp_path / "search.json")
+    generate_pages_recursive(content, template, public, search=search)
+    search.write(public / "search")
+
+    assert search.pages[str(public / "index.html")]["terms"] == {
+        "home": 1,
+        "page": 1,
+        "about": 1,
+        "hobbits": 1,
+    }
+    docs = json.loads((public / "search" / "docs.json").read_text())
+    assert docs["docs"] == [["/", "Home"]]
+
+
+def test_generate_pages_recursive_search_stale(tmp_path):
+    content = tmp_path / "content"
+    content.mkdir()
+    page = content / "index.md"
+    page.write_text("# Home\n\nhobbits")
+    template = tmp_path / "template.html"
+    template.write_text("{{ content }}")
+    public = tmp_path / "public"
+
+    def build(search=None):
+        manifest = Manifest(tmp_path / "manifest.json", "gen")
+        generate_pages_recursive(content, template, public, manifest, search=search)
+        manifest.save()
+        if search is not None:
+            search.save()
+
+    build(SearchIndex(tmp_path / "search.json"))
+    # edited, then built without the search index
+    page.write_text("# Home\n\nzanzibarword")
+    build()
+    search = SearchIndex(tmp_path / "search.json")
+    build(search)
+    assert "zanzibarword" in search.pages[str(public / "index.html")]["terms"]
+
+    # and an untouched page keeps its entry
+    search = SearchIndex(tmp_path / "search.json")
+    build(search)
+    assert search.pages == search.previous
+
+
+def test_check_site(tmp_path):
+    content = tmp_path / "content"
+    (content / "blog").mkdir(parents=True)
+    (content / "index.md").write_text("# Home\n\n[blog](/blog) [post](/blog/post.html)")
+    (content / "blog" / "index.md").write_text("# Blog\n\n[home](/#home) [x](/x.png)")
+    static = tmp_path / "static"
+    static.mkdir()
+    (static / "x.png").write_bytes(b"")
+    template = tmp_path / "template.html"
+    template.write_text("{{ content }}")
+
+    public = tmp_path / "public"
+    manifest = Manifest(tmp_path / "manifest.json", "gen")
+    generate_pages_recursive(content, template, public, manifest)
+
+    broken = main.check_site(content, static, public, manifest)
+    assert broken == [
+        (
+            str(content / "index.md"),
+            3,
+            "link",
+            "/blog/post.html",
+            "no such page or file",
+        )
+    ]
+
+
+def test_generate_pages_recursive_tree_cache(tmp_path):
+    content = tmp_path / "content"
+    content.mkdir()
+    (content / "index.md").write_text("# Home\n\nSome [text](/a.html).")
+    template = tmp_path / "template.html"
+    template.write_text("<title>{{ title }}</title>{{ content }}")
+
+    public = tmp_path / "public"
+    trees = TreeCache(tmp_path / "trees")
+    generate_pages_recursive(content, template, public, trees=trees)
+    first = (public / "index.html").read_text()
+
+    # a template change renders the same tree, straight from the cache
+    template.write_text("<h6>{{ title }}</h6>{{ content }}")
+    timer = PageTimer()
+    build_page(
+        content / "index.md", template, public / "index.html", timer, trees=trees
+    )
+    assert "load_tree" in timer.stages
+    assert not any(stage.startswith("block:") for stage in timer.stages)
+    assert (public / "index.html").read_text() == first.replace("title>", "h6>")
@@ -0,0 +1,88 @@
+import manifest
+
+from manifest import GENERATOR_MODULES, Manifest, generator_hash
+
+
+def test_manifest(tmp_path):
+    src = tmp_path / "index.md"
+    dest = tmp_path / "index.html"
+    src.write_text("# hello")
+    dest.write_text("<h1>hello</h1>")
+
+    path = tmp_path / "manifest.json"
+    m = Manifest(path, "gen-1")
+    assert not m.is_fresh(dest)
+    m.record(dest, [src])
+    m.save()
+
+    m = Manifest(path, "gen-1")
+    assert m.is_fresh(dest)
+    m.keep(dest)
+    assert m.stale_outputs() == []
+
+    src.write_text("# hello world")
+    assert not Manifest(path, "gen-1").is_fresh(dest)
+
+    src.write_text("# hello")
+    assert not Manifest(path, "gen-2").is_fresh(dest)
+
+    dest.unlink()
+    assert not Manifest(path, "gen-1").is_fresh(dest)
+
+    # pages that are not seen again are reported as stale
+    assert Manifest(path, "gen-1").stale_outputs() == [str(dest)]
+
+
+def test_manifest_stale_reason(tmp_path):
+    src = tmp_path / "index.md"
+    partial = tmp_path / "nav.html"
+    dest = tmp_path / "index.html"
+    for p in (src, partial, dest):
+        p.write_text("x")
+
+    path = tmp_path / "manifest.json"
+    m = Manifest(path, "gen-1")
+    assert m.stale_reason(dest) == "new page"
+    m.record(dest, [src, partial])
+    m.save()
+
+    assert Manifest(path, "gen-1").stale_reason(dest) is None
+    assert Manifest(path, "gen-2").stale_reason(dest) == "generator or config changed"
+
+    partial.write_text("changed")
+    assert Manifest(path, "gen-1").stale_reason(dest) == f"{str(partial)!r} changed"
+    partial.unlink()
+    assert Manifest(path, "gen-1").stale_reason(dest) == f"{str(partial)!r} deleted"
+    dest.unlink()
+    assert Manifest(path, "gen-1").stale_reason(dest) == "output missing"
+
+
+def test_manifest_missing_dep(tmp_path):
+    src = tmp_path / "index.md"
+    image = tmp_path / "new.png"
+    dest = tmp_path / "index.html"
+    src.write_text("![new](/new.png)")
+    dest.write_text("x")
+
+    path = tmp_path / "manifest.json"
+    m = Manifest(path, "gen")
+    m.record(dest, [src, image])
+    m.save()
+    assert Manifest(path, "gen").stale_reason(dest) is None
+
+    image.write_bytes(b"png")
+    assert Manifest(path, "gen").stale_reason(dest) == f"{str(image)!r} added"
+
+
+def test_generator_hash(tmp_path, monkeypatch):
+    for name in (*GENERATOR_MODULES, "benchmark.py"):
+        (tmp_path / name).write_text(name)
+    monkeypatch.setattr(manifest, "__file__", str(tmp_path / "manifest.py"))
+    h = generator_hash("template.html")
+    assert generator_hash("other.html") != h
+
+    # tooling doesn't change what pages look like
+    (tmp_path / "benchmark.py").write_text("changed")
+    assert generator_hash("template.html") == h
+    (tmp_path / "text_node.py").write_text("changed")
+    assert generator_hash("template.html") != h
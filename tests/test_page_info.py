@@ -0,0 +1,44 @@
+from block_cache import BlockCache
+from page_info import PageInfo, slugify
+from text_node import parse_markdown
+
+
+def test_slugify():
+    assert slugify("Hello, World!") == "hello-world"
+    assert slugify("  The *Lord* of  the -- Rings ") == "the-lord-of-the-rings"
+    assert slugify("!!!") == ""
+
+
+def test_page_info_anchors():
+    info = PageInfo()
+    assert info.add_heading(2, "Intro") == "intro"
+    assert info.add_heading(2, "Intro") == "intro-1"
+    assert info.add_heading(3, "?") == "section"
+
+
+def test_parse_markdown():
+    markdown = (
+        "# The **big** one\n\n"
+        "Some [link](/a.html) and ![pic](/p.png) here.\n\n"
+        "## Next\n\n"
+        "- [other](https://example.com)\n\n"
+        "## Next"
+    )
+    node, info = parse_markdown(markdown)
+    assert info.headings == [
+        {"level": 1, "text": "The big one", "anchor": "the-big-one"},
+        {"level": 2, "text": "Next", "anchor": "next"},
+        {"level": 2, "text": "Next", "anchor": "next-1"},
+    ]
+    assert info.links == ["/a.html", "https://example.com"]
+    assert info.images == [{"src": "/p.png", "alt": "pic"}]
+    assert info.words == 10
+    assert node.children[0].to_html() == '<h1 id="the-big-one">The <b>big</b> one</h1>'
+
+    # cached blocks bring their part of the info with them
+    cache = BlockCache()
+    parse_markdown(markdown, cache=cache)
+    cached_node, cached_info = parse_markdown(markdown, cache=cache)
+    assert cache.hits == 2
+    assert cached_info.to_dict() == info.to_dict()
+    assert cached_node.to_html() == node.to_html()
@@ -0,0 +1,39 @@
+import os
+
+from preview import PreviewSite
+
+
+def test_preview_site(tmp_path):
+    content = tmp_path / "content"
+    (content / "blog").mkdir(parents=True)
+    (content / "index.md").write_text("# home")
+    (content / "blog" / "index.md").write_text("# blog")
+    (content / "blog" / "post.md").write_text("# post")
+    template = content / "template.html"
+    template.write_text("{{ content }}")
+
+    site = PreviewSite(content, template)
+    assert site.find_page("/") == content / "index.md"
+    assert site.find_page("/blog/") == content / "blog" / "index.md"
+    assert site.find_page("/blog/post.html") == content / "blog" / "post.md"
+    assert site.find_page("/blog/../../index.html") == content / "index.md"
+    (tmp_path / "secret.md").write_text("# secret")
+    assert site.find_page("../secret.html") is None
+    assert site.find_page("blog/../../../secret.html") is None
+    assert site.find_page("%2e%2e/secret.html") is None
+    (tmp_path / "other").mkdir()
+    (tmp_path / "other" / "index.md").write_text("# other")
+    assert not site.is_section("../other")
+    assert site.find_page("/blog/missing.html") is None
+    assert site.find_page("/blog") is None
+    assert site.is_section("/blog")
+
+    src = site.find_page("/blog/post.html")
+    html = site.render(src)
+    assert html == b'<div><h1 id="post">post</h1></div>'
+    assert site.render(src) is html
+
+    # a change to the page or its template renders it again
+    template.write_text("<main>{{ content }}</main>")
+    os.utime(template, ns=(0, 1))
+    assert site.render(src) == b'<main><div><h1 id="post">post</h1></div></main>'
@@ -0,0 +1,27 @@
+import json
+
+from profiler import BuildProfile, PageTimer
+
+
+def test_build_profile(tmp_path):
+    profile = BuildProfile()
+
+    slow = PageTimer()
+    slow.add("read", 0.5)
+    slow.add("block:p", 0.25)
+    slow.add("block:p", 0.25)
+    profile.record("slow.md", slow)
+
+    fast = PageTimer()
+    with fast.stage("read"):
+        pass
+    profile.record("fast.md", fast)
+
+    assert profile.slowest_pages(1) == ["slow.md"]
+    assert profile.stage_totals()["block:p"] == (2, 0.5)
+    assert "slow.md" in profile.summary()
+
+    profile.save(tmp_path / "trace.json")
+    data = json.loads((tmp_path / "trace.json").read_text())
+    assert data["pages"]["slow.md"]["counts"]["block:p"] == 2
+    assert data["stages"]["block:p"] == {"count": 2, "seconds": 0.5}
@@ -0,0 +1,48 @@
+import json
+
+from search import SearchIndex, page_url
+
+
+def test_search_index(tmp_path, capsys):
+    out = tmp_path / "search"
+    index = SearchIndex(tmp_path / "search.json")
+    index.add("public/index.html", "/", "Home", {"tolkien": 2, "the": 5}, {"a": "1"})
+    index.add("public/b.html", "/b.html", "B", {"tolkien": 1, "rings": 1})
+    index.write(out)
+    index.save()
+
+    docs = json.loads((out / "docs.json").read_text())
+    assert docs == {"prefix": 2, "docs": [["/b.html", "B"], ["/", "Home"]]}
+    to = json.loads((out / "to.json").read_text())
+    assert to == {"tolkien": [[0, 1], [1, 2]]}
+    assert not (out / "th.json").exists()
+
+    # a rebuilt page keeps its id, untouched shards aren't written again
+    index = SearchIndex(tmp_path / "search.json")
+    assert index.is_current("public/index.html", {"a": "1"})
+    assert not index.is_current("public/index.html", {"a": "2"})
+    assert not index.is_current("public/c.html", {})
+    index.keep("public/index.html")
+    index.add("public/b.html", "/b.html", "B", {"tolkien": 1, "hobbit": 1})
+    capsys.readouterr()
+    index.write(out)
+    assert "2 shards, 1 written, 1 deleted" in capsys.readouterr().out
+    assert not (out / "ri.json").exists()
+    assert json.loads((out / "ho.json").read_text()) == {"hobbit": [[0, 1]]}
+
+    # a new page takes the id a deleted one left free
+    index.save()
+    index = SearchIndex(tmp_path / "search.json")
+    index.keep("public/index.html")
+    index.add("public/c.html", "/c.html", "C", {"shire": 1})
+    index.write(out)
+    docs = json.loads((out / "docs.json").read_text())["docs"]
+    assert docs == [["/c.html", "C"], ["/", "Home"]]
+
+
+def test_page_url(tmp_path):
+    assert page_url("public/index.html", "public") == "/"
+    assert page_url("public/blog/index.html", "public") == "/blog/"
+    assert page_url("public/blog/post.html", "public") == "/blog/post.html"
+    assert page_url("public/docs/reindex.html", "public") == "/docs/reindex.html"
+    assert page_url("public/reindex.html", "public") == "/reindex.html"
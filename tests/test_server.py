@@ -0,0 +1,285 @@
+import gzip
+import http.client
+import io
+import os
+import socket
+import threading
+import time
+
+from functools import partial
+
+import pytest
+
+import server
+
+from server import (
+    CACHE_CONTROL,
+    CORSHTTPRequestHandler,
+    FileCache,
+    IMMUTABLE,
+    PooledHTTPServer,
+)
+
+
+def get(files, path):
+    st, etag, f = files.get(str(path))
+    with f:
+        return st, etag, f.read(), isinstance(f, io.BytesIO)
+
+
+def test_file_cache(tmp_path):
+    small = tmp_path / "small.css"
+    small.write_text("body {}")
+    big = tmp_path / "big.bin"
+    big.write_bytes(b"x" * 100)
+
+    files = FileCache(max_bytes=10, max_file_size=50)
+    st, etag, body, kept = get(files, small)
+    assert body == b"body {}" and st.st_size == 7 and kept
+    assert etag.startswith('"') and etag.endswith('"')
+    assert get(files, small)[1:] == (etag, body, True)
+
+    # big files only get an etag, the bytes are read from disk when served
+    _, big_etag, body, kept = get(files, big)
+    assert body == b"x" * 100 and not kept and big_etag != etag
+    assert get(files, big)[1:] == (big_etag, body, False)
+
+    small.write_text("body { color: red }")
+    os.utime(small, ns=(0, 1))
+    _, new_etag, body, _ = get(files, small)
+    assert new_etag != etag
+    # still served from the bytes just read, but too big to keep in memory
+    assert body == b"body { color: red }"
+    assert str(small) not in files.bodies and files.size <= files.max_bytes
+    # the etags are kept all the same
+    assert files.etags.keys() == {str(big), str(small)}
+
+
+def test_file_cache_without_bodies(tmp_path, monkeypatch):
+    page = tmp_path / "page.html"
+    page.write_text("<p>hi</p>")
+    files = FileCache(max_bytes=0)
+    _, etag, body, _ = get(files, page)
+    assert body == b"<p>hi</p>"
+
+    # disabled means no bodies, not hashing the file on every request
+    monkeypatch.setattr(server.hashlib, "blake2b", None)
+    assert get(files, page)[1:] == (etag, b"<p>hi</p>", False)
+    assert not files.bodies and files.size == 0
+
+
+def test_file_cache_replaced(tmp_path, monkeypatch):
+    page = tmp_path / "page.html"
+    page.write_text("<p>old</p>")
+    files = FileCache(max_bytes=0)
+    get(files, page)
+
+    # replaced like the writer does, between the stat and the open
+    stat = os.stat
+
+    def stat_then_replace(path):
+        st = stat(path)
+        new = tmp_path / "new.html"
+        new.write_text("<p>new page</p>")
+        new.replace(page)
+        return st
+
+    monkeypatch.setattr(server.os, "stat", stat_then_replace)
+    st, _, body, _ = get(files, page)
+    assert body == b"<p>new page</p>" and st.st_size == len(body)
+
+
+@pytest.fixture
+def httpd(tmp_path):
+    handler = partial(CORSHTTPRequestHandler, directory=str(tmp_path))
+    httpd = PooledHTTPServer(("127.0.0.1", 0), handler, workers=2)
+    httpd.site = None
+    httpd.files = FileCache()
+    httpd.cache_control = {**CACHE_CONTROL, ".txt": "no-store"}
+    thread = threading.Thread(target=httpd.serve_forever)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+    thread.join()
+
+
+def request(httpd, path, headers=None):
+    conn = http.client.HTTPConnection(*httpd.server_address, timeout=5)
+    conn.request("GET", path, headers=headers or {})
+    response = conn.getresponse()
+    body = response.read()
+    conn.close()
+    return response, body
+
+
+def test_conditional_requests(httpd, tmp_path):
+    (tmp_path / "index.html").write_text("<p>home</p>")
+    response, body = request(httpd, "/")
+    assert response.status == 200 and body == b"<p>home</p>"
+    etag = response.headers["ETag"]
+    last_modified = response.headers["Last-Modified"]
+
+    for headers in (
+        {"If-None-Match": etag},
+        {"If-None-Match": f'"other", W/{etag}'},
+        {"If-Modified-Since": last_modified},
+        # If-None-Match wins, even when If-Modified-Since would match
+        {"If-None-Match": '"other"', "If-Modified-Since": last_modified},
+    ):
+        response, body = request(httpd, "/index.html", headers)
+        expected = 200 if headers.get("If-None-Match") == '"other"' else 304
+        assert response.status == expected, headers
+        assert response.headers["ETag"] == etag
+
+    response, body = request(
+        httpd, "/", {"If-Modified-Since": "Thu, 01 Jan 1970 00:00:00 GMT"}
+    )
+    assert response.status == 200 and body == b"<p>home</p>"
+
+
+def test_cache_control(httpd, tmp_path):
+    for name in ("page.html", "style.css", "notes.txt", "data.bin"):
+        (tmp_path / name).write_text("x")
+    (tmp_path / "style.0123456789.css").write_text("x")
+
+    expected = {
+        "/page.html": "no-cache",
+        "/style.css": "public, max-age=3600",
+        "/notes.txt": "no-store",
+        "/data.bin": "public, max-age=300",
+        "/style.0123456789.css": IMMUTABLE,
+    }
+    for path, cache_control in expected.items():
+        response, _ = request(httpd, path)
+        assert response.headers["Cache-Control"] == cache_control, path
+
+        # 304s carry it too, so caches can extend the page's lifetime
+        headers = {"If-None-Match": response.headers["ETag"]}
+        response, _ = request(httpd, path, headers)
+        assert response.status == 304
+        assert response.headers["Cache-Control"] == cache_control, path
+
+
+def test_gzip_negotiation(httpd, tmp_path):
+    page = tmp_path / "index.html"
+    page.write_text("<p>home</p>")
+    (tmp_path / "index.html.gz").write_bytes(gzip.compress(b"<p>home</p>"))
+    (tmp_path / "image.png").write_bytes(b"png")
+    (tmp_path / "image.png.gz").write_bytes(b"not served")
+
+    for accept, gzipped in [
+        ("gzip", True),
+        ("br, gzip;q=0.5", True),
+        ("*", True),
+        ("GZIP", True),
+        ("deflate, Gzip;Q=0.8", True),
+        ("*;q=0.5, gzip;q=0", False),
+        ("gzip;q=0, *", False),
+        ("*;q=0", False),
+        ("gzip;q=0", False),
+        ("br", False),
+        (None, False),
+    ]:
+        headers = {"Accept-Encoding": accept} if accept else {}
+        response, body = request(httpd, "/", headers)
+        assert response.headers["Vary"] == "Accept-Encoding"
+        assert response.headers["Content-Type"] == "text/html"
+        if gzipped:
+            assert response.headers["Content-Encoding"] == "gzip", accept
+            assert gzip.decompress(body) == b"<p>home</p>"
+        else:
+            assert "Content-Encoding" not in response.headers, accept
+            assert body == b"<p>home</p>"
+
+    # only compressible types are negotiated at all
+    response, body = request(httpd, "/image.png", {"Accept-Encoding": "gzip"})
+    assert body == b"png"
+    assert "Vary" not in response.headers
+    assert "Content-Encoding" not in response.headers
+
+
+def test_idle_connections_dont_hold_workers(httpd, tmp_path):
+    (tmp_path / "index.html").write_text("<p>home</p>")
+
+    # more idle keep-alive connections than the server has workers
+    idle = []
+    for _ in range(6):
+        conn = http.client.HTTPConnection(*httpd.server_address, timeout=5)
+        conn.request("GET", "/")
+        assert conn.getresponse().read() == b"<p>home</p>"
+        idle.append(conn)
+
+    response, body = request(httpd, "/")
+    assert response.status == 200 and body == b"<p>home</p>"
+
+    # and each of them is still good for another request
+    for conn in idle:
+        conn.request("GET", "/index.html")
+        assert conn.getresponse().read() == b"<p>home</p>"
+        conn.close()
+
+
+def test_parked_connection_resumed_at_once(httpd, tmp_path, monkeypatch):
+    (tmp_path / "a.txt").write_text("a")
+    park = httpd.park
+    get = httpd.files.get
+
+    def slow_park(handler):
+        # the next request is resumed on another worker before this returns,
+        # and is still being handled when it does
+        park(handler)
+        time.sleep(0.05)
+
+    def slow_get(path):
+        time.sleep(0.1)
+        return get(path)
+
+    monkeypatch.setattr(httpd, "park", slow_park)
+    monkeypatch.setattr(httpd.files, "get", slow_get)
+    conn = http.client.HTTPConnection(*httpd.server_address, timeout=5)
+    for _ in range(3):
+        conn.request("GET", "/a.txt")
+        assert conn.getresponse().read() == b"a"
+    conn.close()
+
+
+def test_keep_alive_small_files(httpd, tmp_path):
+    (tmp_path / "index.css").write_text("p {}")
+    conn = http.client.HTTPConnection(*httpd.server_address, timeout=5)
+    start = time.perf_counter()
+    for _ in range(20):
+        conn.request("GET", "/index.css")
+        assert conn.getresponse().read() == b"p {}"
+    conn.close()
+    # a delayed ack costs ~40ms per request
+    assert time.perf_counter() - start < 0.4
+
+
+def test_pipelined_requests(httpd, tmp_path):
+    (tmp_path / "a.txt").write_text("a")
+    (tmp_path / "b.txt").write_text("b")
+    with socket.create_connection(httpd.server_address, timeout=5) as sock:
+        sock.sendall(
+            b"GET /a.txt HTTP/1.1\r\nHost: x\r\n\r\n"
+            b"GET /b.txt HTTP/1.1\r\nHost: x\r\nConnection: close\r\n\r\n"
+        )
+        data = b""
+        while chunk := sock.recv(4096):
+            data += chunk
+
+    assert data.count(b"HTTP/1.1 200") == 2
+    assert data.endswith(b"b") and b"\r\n\r\na" in data
+
+
+def test_keep_alive_timeout(httpd, tmp_path):
+    (tmp_path / "a.txt").write_text("a")
+    httpd.keep_alive_timeout = 0.1
+    with socket.create_connection(httpd.server_address, timeout=5) as sock:
+        sock.sendall(b"GET /a.txt HTTP/1.1\r\nHost: x\r\n\r\n")
+        data = b""
+        # the server closes the idle connection once the response is sent
+        while chunk := sock.recv(4096):
+            data += chunk
+
+    assert data.startswith(b"HTTP/1.1 200") and data.endswith(b"a")
@@ -0,0 +1,73 @@
+import pytest
+
+from html_node import LeafNode, ParentNode
+from template import Template, load_template, parse_front_matter, read_front_matter
+
+
+def test_template():
+    t = Template("<title>{{ title }}</title>{{content}}<p>{{ unknown }}</p>")
+    assert t.slots() == {"title", "content", "unknown"}
+
+    content = ParentNode("div", [LeafNode("b", "hi")])
+    html = t.render({"title": "Home", "content": content})
+    assert html == "<title>Home</title><div><b>hi</b></div><p>{{ unknown }}</p>"
+
+    assert Template("no slots").render({}) == "no slots"
+
+
+def test_load_template(tmp_path):
+    path = tmp_path / "template.html"
+    path.write_text("a {{ title }}")
+    t = load_template(path)
+    assert load_template(path) is t
+
+    path.write_text("b {{ title }} {{ title }}")
+    assert load_template(path) is not t
+    assert load_template(path).render({"title": "x"}) == "b x x"
+
+
+def test_load_template_partials(tmp_path):
+    (tmp_path / "parts").mkdir()
+    path = tmp_path / "template.html"
+    path.write_text("<head>{{> parts/head.html }}</head>{{ content }}")
+    head = tmp_path / "parts" / "head.html"
+    head.write_text("<title>{{ title }}</title>{{>meta.html}}")
+    meta = tmp_path / "parts" / "meta.html"
+    meta.write_text("<meta>")
+
+    t = load_template(path)
+    assert t.deps == [path, head, meta]
+    html = t.render({"title": "Home", "content": "hi"})
+    assert html == "<head><title>Home</title><meta></head>hi"
+
+    # a changed partial reloads every template that includes it
+    meta.write_text("<meta charset=utf-8>")
+    assert load_template(path) is not t
+    assert "<meta charset=utf-8>" in load_template(path).render({})
+
+    meta.write_text("{{> ../template.html }}")
+    with pytest.raises(ValueError, match="includes itself"):
+        load_template(path)
+
+
+def test_parse_front_matter():
+    md = "---\ntitle: Hello: World\ntemplate: post.html\n---\n# heading"
+    assert parse_front_matter(md) == (
+        {"title": "Hello: World", "template": "post.html"},
+        "# heading",
+    )
+
+    assert parse_front_matter("# heading\n---\n") == ({}, "# heading\n---\n")
+    assert parse_front_matter("---\nunclosed") == ({}, "---\nunclosed")
+
+
+def test_read_front_matter():
+    lines = ["---\n", "title: Hello\n", "---\n", "# heading\n"]
+    meta, body = read_front_matter(lines)
+    assert meta == {"title": "Hello"}
+    assert list(body) == ["# heading\n"]
+
+    for lines in [["# heading\n", "---\n"], ["---\n", "unclosed"], []]:
+        meta, body = read_front_matter(lines)
+        assert meta == {}
+        assert "".join(body) == "".join(lines)
@@ -7,9 +7,12 @@ from src.text_node import (
     block_to_block_type,
     extract_markdown_images,
     extract_markdown_links,
+    iter_markdown_blocks,
     markdown_to_blocks,
     markdown_to_html_node,
     markdown_to_text_nodes,
+    markdown_to_text_nodes_reference,
+    scan_blocks,
     split_nodes_delimiter,
     split_nodes_image,
     split_nodes_link,
@@ -126,6 +129,47 @@ def test_text_to_text_nodes():
     ]
 
 
+@pytest.mark.parametrize(
+    "markdown",
+    [
+        "plain text",
+        "a **b *c* d** e",
+        "x `code` y and *it* z",
+        "[a](b) and ![i](j) then [c](d).",
+        "x **[a](b)** y",
+        "This is **text** with an *italic* word and a `code block` and an ![image](https://i.imgur.com/zjjcJKZ.png) and a [link](https://boot.dev)",
+    ],
+)
+def test_markdown_to_text_nodes_matches_reference(markdown):
+    assert markdown_to_text_nodes(markdown) == markdown_to_text_nodes_reference(
+        markdown
+    )
+
+
+def test_markdown_to_text_nodes():
+    assert markdown_to_text_nodes("**bold** text") == [
+        TextNode("bold", TT.BOLD),
+        TextNode(" text", TT.TEXT),
+    ]
+
+    assert markdown_to_text_nodes("[l](u) and [l](u)") == [
+        TextNode("l", TT.LINK, "u"),
+        TextNode(" and ", TT.TEXT),
+        TextNode("l", TT.LINK, "u"),
+    ]
+
+    assert markdown_to_text_nodes("`**` is *not* bold") == [
+        TextNode("**", TT.CODE),
+        TextNode(" is ", TT.TEXT),
+        TextNode("not", TT.ITALIC),
+        TextNode(" bold", TT.TEXT),
+    ]
+
+    for markdown in ("a **b", "a *b", "a `b"):
+        with pytest.raises(ValueError):
+            markdown_to_text_nodes(markdown)
+
+
 def test_markdown_to_blocks():
     # leave the empty lines in. We must test that we do not create empty blocks
     markdown = """
@@ -174,6 +218,59 @@ def test_block_to_block_type(md, block_type):
     assert block_to_block_type(block) == block_type
 
 
+def test_scan_blocks():
+    markdown = """
+        # heading
+
+        This is **bolded** paragraph
+        on two lines
+
+        * This is a list
+        * with items
+
+        1. one
+        2. two
+
+        > quote
+
+        ```
+        print(1)
+        ```
+    """
+    expected = [(block_to_block_type(b), b) for b in markdown_to_blocks(markdown)]
+    assert scan_blocks(markdown) == expected
+
+    # fenced code keeps its blank lines, and ends where the fence closes
+    markdown = "```\nfirst\n\n    second\n```\nafter\n\n# title"
+    assert scan_blocks(markdown) == [
+        (BT.CODE, "```\nfirst\n\n    second\n```"),
+        (BT.PARAGRAPH, "after"),
+        (BT.HEADING, "# title"),
+    ]
+
+    # an unclosed fence is just text
+    assert scan_blocks("```\nnot code\n\n# title") == [
+        (BT.PARAGRAPH, "```\nnot code"),
+        (BT.HEADING, "# title"),
+    ]
+
+
+@pytest.mark.parametrize(
+    "markdown",
+    [
+        "# title\n\ntext\n  \n- a\n- b\n",
+        "```\nfirst\n\n    second\n```\nafter\n\n# title",
+        "para\n```\nnot a fence\n\n```\n",
+        "```x```\n```\ncode\n\n```",
+        "```\nnot code\n\n# title",
+        "",
+    ],
+)
+def test_iter_markdown_blocks(markdown):
+    lines = iter(markdown.splitlines(keepends=True))
+    assert list(iter_markdown_blocks(lines)) == scan_blocks(markdown)
+
+
 def test_markdown_to_html_node():
     markdown = """
         ```
@@ -0,0 +1,103 @@
+import marshal
+import os
+
+from assets import AssetMap
+from block_cache import BlockCache
+from text_node import parse_markdown
+from tree_cache import TreeCache, decode_tree, encode_tree
+
+
+MARKDOWN = """# Title
+
+Some **bold** and a [link](/a.html) ![img](/x.png)
+
+## Title
+
+```
+code
+```
+
+> quote
+
+- one
+- two
+
+1. first
+2. second
+"""
+
+
+def test_encode_tree_roundtrip():
+    node, _ = parse_markdown(MARKDOWN, assets=AssetMap(sizes={"/x.png": (4, 3)}))
+    decoded = decode_tree(encode_tree(node))
+    assert decoded == node
+    assert decoded.to_html() == node.to_html()
+
+    cached, _ = parse_markdown(MARKDOWN, cache=BlockCache())
+    assert decode_tree(encode_tree(cached)).to_html() == cached.to_html()
+
+
+def test_tree_cache(tmp_path):
+    trees = TreeCache(tmp_path, namespace="a")
+    assert trees.get(MARKDOWN) is None
+
+    node, info = parse_markdown(MARKDOWN)
+    info.title = "Title"
+    trees.put(MARKDOWN, node, info)
+    cached_node, cached_info = trees.get(MARKDOWN)
+    assert cached_node.to_html() == node.to_html()
+    assert cached_info.to_dict() == info.to_dict()
+    assert cached_info.terms == info.terms
+    assert cached_info.add_heading(2, "Title") == "title-2"
+
+    assert trees.get(MARKDOWN + "\nmore") is None
+    assert TreeCache(tmp_path, namespace="b").get(MARKDOWN) is None
+
+
+def test_tree_cache_prune(tmp_path, capsys):
+    trees = TreeCache(tmp_path)
+    pages = [f"# Page {i}\n\n{'text ' * 100}" for i in range(4)]
+    for i, markdown in enumerate(pages):
+        trees.put(markdown, *parse_markdown(markdown))
+        os.utime(trees.entry_path(markdown), ns=(i, i))
+    # used again, so it's the most recent one now
+    trees.get(pages[0])
+
+    size = trees.entry_path(pages[1]).stat().st_size
+    trees.max_bytes = size * 2 + size // 2
+    trees.prune()
+    assert "2 entries" in capsys.readouterr().out
+    assert trees.get(pages[1]) is None
+    assert trees.get(pages[2]) is None
+    assert trees.get(pages[0]) is not None
+    assert trees.get(pages[3]) is not None
+
+
+def test_tree_cache_refresh(tmp_path):
+    TreeCache(tmp_path).put(MARKDOWN, *parse_markdown(MARKDOWN))
+    trees = TreeCache(tmp_path, refresh=True)
+    assert trees.get(MARKDOWN) is None
+    assert TreeCache(tmp_path).get(MARKDOWN) is not None
+
+
+def test_tree_cache_corrupt_entry(tmp_path):
+    trees = TreeCache(tmp_path)
+    trees.put(MARKDOWN, *parse_markdown(MARKDOWN))
+    path = trees.entry_path(MARKDOWN)
+    data = path.read_bytes()
+
+    for corrupt in (data[: len(data) // 2], b"junk", marshal.dumps([1, 2])):
+        path.write_bytes(corrupt)
+        assert trees.get(MARKDOWN) is None
+
+    trees.put(MARKDOWN, *parse_markdown(MARKDOWN))
+    assert trees.get(MARKDOWN) is not None
+
+
+def test_tree_cache_assets(tmp_path):
+    trees = TreeCache(tmp_path)
+    assets = AssetMap(sizes={"/x.png": (4, 3)})
+    trees.put(MARKDOWN, *parse_markdown(MARKDOWN, assets=assets), assets)
+    assert trees.get(MARKDOWN, AssetMap(sizes={"/x.png": (4, 3), "/y.png": (1, 1)}))
+    assert trees.get(MARKDOWN, AssetMap(sizes={"/x.png": (8, 6)})) is None
+    assert trees.get(MARKDOWN) is None
@@ -0,0 +1,41 @@
+import os
+
+import watch
+
+from watch import changed_files, snapshot
+
+
+def test_snapshot(tmp_path):
+    (tmp_path / "sub").mkdir()
+    a = tmp_path / "a.md"
+    b = tmp_path / "sub" / "b.md"
+    a.write_text("a")
+    b.write_text("b")
+
+    before = snapshot([tmp_path])
+    assert sorted(before) == [str(a), str(b)]
+
+    b.write_text("bb")
+    a.unlink()
+    c = tmp_path / "c.md"
+    c.write_text("c")
+    os.utime(b, ns=(0, 0))
+
+    after = snapshot([tmp_path, tmp_path / "missing"])
+    assert changed_files(before, after) == [str(a), str(c), str(b)]
+    assert changed_files(after, after) == []
+
+
+def test_snapshot_file_deleted_while_listing(tmp_path, monkeypatch):
+    (tmp_path / "a.md").write_text("a")
+    tmp = tmp_path / ".a.md.swp"
+    tmp.write_text("a")
+    scandir = os.scandir
+
+    def scandir_then_delete(path):
+        entries = list(scandir(path))
+        tmp.unlink(missing_ok=True)
+        return iter(entries)
+
+    monkeypatch.setattr(watch.os, "scandir", scandir_then_delete)
+    assert list(snapshot([tmp_path])) == [str(tmp_path / "a.md")]
@@ -0,0 +1,47 @@
+import os
+
+import pytest
+
+from writer import Writer, write_file
+
+
+def test_write_file(tmp_path):
+    path = tmp_path / "page.html"
+    assert write_file(path, b"<p>one</p>")
+    assert path.read_bytes() == b"<p>one</p>"
+
+    os.utime(path, ns=(1, 1))
+    assert not write_file(path, b"<p>one</p>")
+    assert path.stat().st_mtime_ns == 1
+
+    assert write_file(path, b"<p>two</p>")
+    assert path.read_bytes() == b"<p>two</p>"
+    assert [p.name for p in tmp_path.iterdir()] == ["page.html"]
+
+
+def test_writer(tmp_path, capsys):
+    (tmp_path / "a").mkdir()
+    (tmp_path / "a" / "0.html").write_bytes(b"page 0")
+    with Writer(threads=3, max_pending=2) as writer:
+        for i in range(20):
+            writer.write(
+                tmp_path / "a" / f"{i % 5}" / f"{i}.html", f"page {i}".encode()
+            )
+        writer.write(tmp_path / "a" / "0.html", b"page 0")
+
+    assert capsys.readouterr().out == "[INFO] Wrote 20 page(s), 1 unchanged\n"
+    for i in range(20):
+        assert (
+            tmp_path / "a" / f"{i % 5}" / f"{i}.html"
+        ).read_bytes() == b"page %d" % i
+    assert writer.dirs == {tmp_path / "a", *(tmp_path / "a" / str(i) for i in range(5))}
+
+
+def test_writer_error(tmp_path):
+    (tmp_path / "file").write_text("")
+    with pytest.raises(OSError):
+        with Writer() as writer:
+            writer.write(tmp_path / "file" / "page.html", b"x")
+            writer.write(tmp_path / "ok.html", b"x")
+
+    assert (tmp_path / "ok.html").read_bytes() == b"x"